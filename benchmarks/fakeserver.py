@@ -0,0 +1,533 @@
+"""An in-process stand-in for seahub and the fileserver, implementing the
+endpoints this library uses, so that it can be benchmarked without a real
+Seafile server.
+
+Everything is kept in memory. The server accepts any username and password
+and hands out a single token.
+"""
+import copy
+import email.parser
+import email.policy
+import hashlib
+import io
+import json
+import posixpath
+import re
+import threading
+import time
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+
+TOKEN = 'a' * 40
+ZERO_OBJ_ID = '0' * 40
+
+
+class Node(object):
+    """A file or a folder. The id of a folder derives from the ids of its
+    children, like the object ids of Seafile do."""
+    def __init__(self, isdir, content=b''):
+        self.isdir = isdir
+        self.children = {} if isdir else None
+        self.content = content
+        self.mtime = int(time.time())
+
+    @property
+    def content(self):
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self._id = hashlib.sha1(content).hexdigest() if content else ZERO_OBJ_ID
+
+    @property
+    def id(self):
+        if not self.isdir:
+            return self._id
+        if not self.children:
+            return ZERO_OBJ_ID
+        h = hashlib.sha1()
+        for name in sorted(self.children):
+            h.update(name.encode() + self.children[name].id.encode())
+        return h.hexdigest()
+
+
+class Repo(object):
+    def __init__(self, name):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.root = Node(True)
+
+    def lookup(self, path):
+        node = self.root
+        for part in [p for p in path.split('/') if p]:
+            if not node.isdir or part not in node.children:
+                return None
+            node = node.children[part]
+        return node
+
+    def makedirs(self, path):
+        node = self.root
+        for part in [p for p in path.split('/') if p]:
+            node = node.children.setdefault(part, Node(True))
+        return node
+
+
+class State(object):
+    """The libraries and the pending tokens and tasks of the server.
+
+    `fail` maps `(method, path)` keys, where ids are replaced by "{id}", to
+    a list of statuses the next requests get instead of being handled, to
+    inject errors.
+    """
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.repos = {}
+        self.tokens = {}
+        self.uploads = {}
+        self.zips = {}
+        self.tasks = {}
+        self.counts = {}
+        self.fail = {}
+
+    def new_token(self, kind, payload):
+        tok = uuid.uuid4().hex
+        self.tokens[tok] = (kind, payload)
+        return tok
+
+
+def dirent_json(name, node, parent=None):
+    d = {'type': 'dir' if node.isdir else 'file', 'name': name,
+         'id': node.id, 'mtime': node.mtime, 'permission': 'rw'}
+    if not node.isdir:
+        d['size'] = len(node.content)
+    if parent is not None:
+        d['parent_dir'] = parent
+    return d
+
+
+class _Unseekable(io.RawIOBase):
+    """Makes :mod:`zipfile` write data descriptors, like the fileserver
+    which streams its archives"""
+    def __init__(self):
+        self.buf = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buf.write(data)
+
+
+def make_zip(parent, names):
+    out = _Unseekable()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        def add(path, node):
+            if node.isdir:
+                archive.writestr(zipfile.ZipInfo(path + '/'), b'')
+                for name, child in sorted(node.children.items()):
+                    add(path + '/' + name, child)
+            else:
+                archive.writestr(zipfile.ZipInfo(path), node.content,
+                                 zipfile.ZIP_DEFLATED)
+        for name in names:
+            add(name, parent.children[name])
+    return out.buf.getvalue()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are written separately
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def send(self, code, body=b'', ctype='application/json', headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            out = io.BytesIO()
+            while True:
+                line = self.rfile.readline()
+                n = int(line.strip().split(b';')[0], 16)
+                if n == 0:
+                    self.rfile.readline()
+                    break
+                out.write(self.rfile.read(n))
+                self.rfile.readline()
+            return out.getvalue()
+        n = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(n)
+
+    def form(self, body):
+        ctype = self.headers.get('Content-Type', '')
+        if ctype.startswith('multipart/'):
+            msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                b'Content-Type: ' + ctype.encode() + b'\r\n\r\n' + body)
+            fields, files = {}, []
+            for part in msg.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                filename = part.get_param('filename', header='content-disposition')
+                payload = part.get_payload(decode=True)
+                if filename is not None and name == 'file':
+                    files.append((name, filename, payload))
+                else:
+                    fields.setdefault(name, []).append(payload.decode())
+            return fields, files
+        if 'json' in ctype:
+            return json.loads(body.decode() or '{}'), []
+        return {k: v for k, v in parse_qs(body.decode()).items()}, []
+
+    def handle_any(self):
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        u = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        qs = parse_qs(u.query)
+        path = u.path
+        with self.state.lock:
+            key = (self.command, re.sub(r'[0-9a-f-]{32,}', '{id}', path))
+            self.state.counts[key] = self.state.counts.get(key, 0) + 1
+            fail = self.state.fail.get(key)
+            if fail:
+                self.state.fail[key] = fail[1:]
+                self.read_body()
+                return self.send(fail[0], {'error_msg': 'injected'},
+                                 headers={'Retry-After': '0'})
+        body = self.read_body() if self.command in ('POST', 'PUT', 'DELETE') else b''
+        if path.startswith('/seafhttp/'):
+            return self.fileserver(path, q, body)
+        if path == '/api2/auth-token/':
+            return self.send(200, {'token': TOKEN})
+        if self.headers.get('Authorization') != 'Token ' + TOKEN:
+            return self.send(401, {'detail': 'Invalid token'})
+        if path == '/api2/auth/ping/':
+            return self.send(200, b'"pong"')
+        if path == '/api2/repos/':
+            if self.command == 'POST':
+                fields, _ = self.form(body)
+                r = Repo(fields['name'][0])
+                self.state.repos[r.id] = r
+                return self.send(200, {'repo_id': r.id})
+            return self.send(200, [self.repo_json(r) for r in self.state.repos.values()])
+        m = re.match(r'^/api2/repos/([^/]+)/?(.*)$', path)
+        if m:
+            repo = self.state.repos.get(m.group(1))
+            if repo is None:
+                return self.send(404, {'error_msg': 'no repo'})
+            return self.api2_repo(repo, '/' + m.group(2), q, body)
+        m = re.match(r'^/api/v2.1/repos/([0-9a-f-]{36})/(.*)$', path)
+        if m:
+            repo = self.state.repos.get(m.group(1))
+            if repo is None:
+                return self.send(404, {'error_msg': 'no repo'})
+            return self.v21_repo(repo, '/' + m.group(2), q, qs, body)
+        return self.v21(path, q, body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = handle_any
+
+    def repo_json(self, r):
+        return {'id': r.id, 'name': r.name, 'desc': '', 'encrypted': False,
+                'owner': 'self', 'permission': 'rw', 'size': 0}
+
+    def api2_repo(self, repo, sub, q, body):
+        p = q.get('p', '/')
+        if sub == '/':
+            if self.command == 'DELETE':
+                del self.state.repos[repo.id]
+                return self.send(200, b'"success"')
+            return self.send(200, self.repo_json(repo))
+        if sub == '/dir/':
+            node = repo.lookup(p)
+            if self.command == 'POST':
+                fields, _ = self.form(body)
+                parent = repo.lookup(posixpath.dirname(p))
+                if parent is None:
+                    if fields.get('create_parents', ['false'])[0] != 'true':
+                        return self.send(400, {'error_msg': 'parent'})
+                    parent = repo.makedirs(posixpath.dirname(p))
+                name = posixpath.basename(p)
+                if fields.get('operation', [''])[0] == 'rename':
+                    parent.children[fields['newname'][0]] = parent.children.pop(name)
+                    return self.send(200, b'"success"')
+                parent.children.setdefault(name, Node(True))
+                return self.send(200, [dirent_json(n, c) for n, c in parent.children.items()],
+                                 headers={'oid': parent.id})
+            if self.command == 'DELETE':
+                parent = repo.lookup(posixpath.dirname(p))
+                parent.children.pop(posixpath.basename(p), None)
+                return self.send(200, b'"success"')
+            if node is None or not node.isdir:
+                return self.send(404, {'error_msg': 'no dir'})
+            if q.get('oid') == node.id:
+                return self.send(200, b'"uptodate"', headers={'oid': node.id})
+            return self.send(200, [dirent_json(n, c) for n, c in sorted(node.children.items())],
+                             headers={'oid': node.id})
+        if sub == '/file/detail/':
+            node = repo.lookup(p)
+            if node is None or node.isdir:
+                return self.send(404, {'error_msg': 'no file'})
+            return self.send(200, {'id': node.id, 'size': len(node.content),
+                                   'name': posixpath.basename(p), 'mtime': node.mtime})
+        if sub == '/file/':
+            if self.command == 'POST':
+                fields, _ = self.form(body)
+                parent = repo.lookup(posixpath.dirname(p))
+                op = fields['operation'][0]
+                if op == 'create':
+                    parent.children[posixpath.basename(p)] = Node(False)
+                elif op == 'rename':
+                    node = parent.children.pop(posixpath.basename(p))
+                    parent.children[fields['newname'][0]] = node
+                return self.send(200, [dirent_json(n, c) for n, c in parent.children.items()],
+                                 headers={'oid': parent.id})
+            if self.command == 'DELETE':
+                parent = repo.lookup(posixpath.dirname(p))
+                parent.children.pop(posixpath.basename(p), None)
+                return self.send(200, b'"success"')
+            node = repo.lookup(p)
+            if node is None or node.isdir:
+                return self.send(404, {'error_msg': 'no file'})
+            # Like with Seafile, the token gives access to this version of the file
+            tok = self.state.new_token('files', (node.content, q.get('reuse') == '1'))
+            url = 'http://%s/seafhttp/files/%s/%s' % (self.headers['Host'], tok,
+                                                       quote(posixpath.basename(p)))
+            return self.send(200, json.dumps(url).encode(), headers={'oid': node.id})
+        if sub in ('/upload-link/', '/update-link/'):
+            kind = 'upload' if sub == '/upload-link/' else 'update'
+            tok = self.state.new_token(kind, repo.id)
+            return self.send(200, json.dumps('http://%s/seafhttp/%s-api/%s' % (
+                self.headers['Host'], kind, tok)).encode())
+        return self.send(404, {'error_msg': 'unknown ' + sub})
+
+    def v21_repo(self, repo, sub, q, qs, body):
+        if sub == '/dir/':
+            p = q.get('p', '/')
+            node = repo.lookup(p)
+            if node is None:
+                return self.send(404, {'error_msg': 'no dir'})
+            out = []
+            def rec(path, n):
+                for name, c in sorted(n.children.items()):
+                    if q.get('t') == 'd' and not c.isdir:
+                        continue
+                    out.append(dirent_json(name, c, parent=path))
+                    if c.isdir and q.get('recursive') == '1':
+                        rec(posixpath.join(path, name), c)
+            rec(p if p.endswith('/') else p + '/', node)
+            return self.send(200, {'user_perm': 'rw', 'dir_id': node.id, 'dirent_list': out})
+        if sub == '/zip-task/':
+            parent_dir = q.get('parent_dir', '/')
+            parent = repo.lookup(parent_dir)
+            if parent is None or not parent.isdir:
+                return self.send(404, {'error_msg': 'no dir'})
+            names = qs.get('dirents', [])
+            if any(name not in parent.children for name in names):
+                return self.send(404, {'error_msg': 'no dirent'})
+            token = uuid.uuid4().hex
+            # Ready after a couple of progress queries, like a slow zip
+            self.state.zips[token] = [2, make_zip(parent, names), len(names)]
+            return self.send(200, {'zip_token': token})
+        if sub == '/file-uploaded-bytes/':
+            buf = self.state.uploads.get((repo.id, q['parent_dir'], q['file_name']), b'')
+            return self.send(200, {'uploadedBytes': len(buf)})
+        return self.send(404, {'error_msg': 'unknown v21 ' + sub})
+
+    def v21(self, path, q, body):
+        m = re.match(r'^/api/v2.1/repos/(sync|async)-batch-(copy|move)-item/$', path)
+        if m and self.command == 'POST':
+            data = json.loads(body.decode())
+            src = self.state.repos[data['src_repo_id']]
+            dst = self.state.repos[data['dst_repo_id']]
+            sp = src.lookup(data['src_parent_dir'])
+            dp = dst.lookup(data['dst_parent_dir'])
+            if sp is None or dp is None:
+                return self.send(404, {'error_msg': 'no dir'})
+            for name in data['src_dirents']:
+                if name not in sp.children:
+                    return self.send(404, {'error_msg': 'no dirent %s' % name})
+            for name in data['src_dirents']:
+                node = sp.children[name]
+                if m.group(2) == 'move':
+                    del sp.children[name]
+                else:
+                    node = copy.deepcopy(node)
+                dp.children[name] = node
+            if m.group(1) == 'sync':
+                return self.send(200, {'success': True})
+            task_id = uuid.uuid4().hex
+            self.state.tasks[task_id] = [2]
+            return self.send(200, {'task_id': task_id})
+        if path == '/api/v2.1/query-copy-move-progress/':
+            task = self.state.tasks.get(q.get('task_id'))
+            if task is None:
+                return self.send(400, {'error_msg': 'no task'})
+            task[0] -= 1
+            done = task[0] <= 0
+            return self.send(200, {'done': done, 'total': 1, 'canceled': False,
+                                   'failed': False, 'successful': done})
+        if path == '/api/v2.1/query-zip-progress/':
+            task = self.state.zips.get(q.get('token'))
+            if task is None:
+                return self.send(400, {'error_msg': 'no zip task'})
+            task[0] -= 1
+            total = task[2]
+            return self.send(200, {'zipped': total if task[0] <= 0 else 0, 'total': total,
+                                   'failed': 0, 'failed_reason': '', 'canceled': 0})
+        if path == '/api/v2.1/copy-move-task/' and self.command == 'POST':
+            fields, _ = self.form(body)
+            f = {k: v[0] for k, v in fields.items()}
+            src = self.state.repos[f['src_repo_id']]
+            dst = self.state.repos[f['dst_repo_id']]
+            sp = src.lookup(f['src_parent_dir'])
+            dp = dst.lookup(f['dst_parent_dir'])
+            node = sp.children[f['src_dirent_name']]
+            if f['operation'] == 'move':
+                del sp.children[f['src_dirent_name']]
+            else:
+                node = copy.deepcopy(node)
+            dp.children[f['src_dirent_name']] = node
+            return self.send(200, {'task_id': ''})
+        if path == '/api/v2.1/repos/batch-delete-item/' and self.command == 'DELETE':
+            data = json.loads(body.decode())
+            repo = self.state.repos[data['repo_id']]
+            parent = repo.lookup(data['parent_dir'])
+            if parent is None:
+                return self.send(404, {'error_msg': 'no dir'})
+            for name in data['dirents']:
+                parent.children.pop(name, None)
+            return self.send(200, {'success': True})
+        return self.send(404, {'error_msg': 'unknown ' + path})
+
+    def fileserver(self, path, q, body):
+        parts = path.split('/')
+        kind, tok = parts[2], parts[3] if len(parts) > 3 else None
+        if kind == 'files':
+            entry = self.state.tokens.get(tok)
+            if entry is None:
+                return self.send(403, b'Access denied', ctype='text/plain')
+            data, reuse = entry[1]
+            if not reuse:
+                self.state.tokens.pop(tok, None)
+            rng = self.headers.get('Range')
+            if rng:
+                m = re.match(r'bytes=(\d+)-(\d*)', rng)
+                start = int(m.group(1))
+                end = int(m.group(2)) if m.group(2) else len(data) - 1
+                end = min(end, len(data) - 1)
+                return self.send(206, data[start:end + 1], ctype='application/octet-stream',
+                                 headers={'Content-Range': 'bytes %d-%d/%d' % (start, end, len(data))})
+            return self.send(200, data, ctype='application/octet-stream')
+        if kind == 'zip':
+            task = self.state.zips.pop(tok, None)
+            if task is None or task[0] > 0:
+                return self.send(400, b'Bad zip token', ctype='text/plain')
+            return self.send(200, task[1], ctype='application/zip')
+        if kind in ('upload-api', 'update-api'):
+            entry = self.state.tokens.get(tok)
+            if entry is None:
+                return self.send(403, b'Access denied', ctype='text/plain')
+            repo = self.state.repos[entry[1]]
+            fields, files = self.form(body)
+            ret = []
+            if kind == 'update-api':
+                target = fields['target_file'][0]
+                node = repo.lookup(target)
+                node.content = files[0][2]
+                return self.send(200, json.dumps(node.id).encode())
+            parent_dir = fields['parent_dir'][0]
+            for _, filename, payload in files:
+                rel = fields.get('relative_path', [''])[0]
+                d = repo.makedirs(posixpath.join(parent_dir, rel))
+                crange = self.headers.get('Content-Range')
+                if crange:
+                    m = re.match(r'bytes (\d+)-(\d+)/(\d+)', crange)
+                    start, end, total = map(int, m.groups())
+                    key = (repo.id, parent_dir, filename)
+                    buf = self.state.uploads.setdefault(key, bytearray())
+                    if start != len(buf):
+                        return self.send(400, {'error_msg': 'bad range'})
+                    buf.extend(payload)
+                    if end + 1 < total:
+                        return self.send(200, {'success': True})
+                    payload = bytes(self.state.uploads.pop(key))
+                name = filename
+                n = 1
+                while name in d.children and fields.get('replace', ['0'])[0] != '1':
+                    base, ext = posixpath.splitext(filename)
+                    name = '%s (%d)%s' % (base, n, ext)
+                    n += 1
+                d.children[name] = Node(False, payload)
+                ret.append({'name': name, 'id': d.children[name].id, 'size': len(payload)})
+            if q.get('ret-json') == '1':
+                return self.send(200, ret)
+            return self.send(200, ','.join(r['id'] for r in ret).encode(), ctype='text/plain')
+        return self.send(404, b'unknown', ctype='text/plain')
+
+
+class FakeSeafileServer(object):
+    """A fake Seafile server running in a background thread.
+
+    :param:`port` the port to listen to on 127.0.0.1, 0 picks a free one
+    :param:`latency` how many seconds every request is delayed, to mimic
+    the round trip to a remote server
+    """
+    def __init__(self, port=0, latency=0):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = State(latency)
+        self.url = 'http://127.0.0.1:%d' % self.httpd.server_address[1]
+        self._thread = None
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    def add_files(self, repo_id, paths, content=b''):
+        """Create files with `content` at `paths` of a library, along with
+        their parent folders, without going through the api"""
+        with self.state.lock:
+            repo = self.state.repos[repo_id]
+            for path in paths:
+                parent = repo.makedirs(posixpath.dirname(path))
+                parent.children[posixpath.basename(path)] = Node(False, content)
+
+    def request_counts(self):
+        """Return how many requests each `(method, path)` got"""
+        with self.state.lock:
+            return dict(self.state.counts)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,212 @@
+"""Run the benchmarks against an in-process fake Seafile server.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json
+
+Each benchmark repeats an operation for at least `--min-time` seconds and
+reports its rate and latency percentiles. With `--compare`, the rates are
+compared to those of a previous run, and the command fails if one of them
+dropped by more than `--threshold`.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import seafileapi
+
+from benchmarks.fakeserver import FakeSeafileServer
+
+DEFAULT_SIZES = '1K,1M,16M'
+DEFAULT_ENTRIES = '10,1000,10000'
+DEFAULT_MIN_TIME = 1.0
+DEFAULT_MAX_ITERATIONS = 1000
+DEFAULT_THRESHOLD = 0.2
+# Payloads from which segmented downloads are measured too
+SEGMENTED_MIN_SIZE = 4 * 1024 * 1024
+UNITS = {'K': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}
+
+
+def parse_size(value):
+    value = value.strip().upper()
+    if value[-1:] in UNITS:
+        return int(float(value[:-1]) * UNITS[value[-1]])
+    return int(value)
+
+
+def percentile(latencies, q):
+    """Return the `q` (0 to 100) percentile of sorted `latencies`"""
+    index = min(len(latencies) - 1, int(round(q / 100.0 * (len(latencies) - 1))))
+    return latencies[index]
+
+
+class Benchmark(object):
+    """An operation to measure, `func` is called with no argument for every
+    iteration. `nbytes` is the payload size of a transfer."""
+    def __init__(self, name, func, nbytes=0):
+        self.name = name
+        self.func = func
+        self.nbytes = nbytes
+
+    def run(self, min_time=DEFAULT_MIN_TIME, max_iterations=DEFAULT_MAX_ITERATIONS):
+        self.func()  # warm up connections and caches
+        latencies = []
+        start = time.perf_counter()
+        elapsed = 0
+        while elapsed < min_time and len(latencies) < max_iterations:
+            op_start = time.perf_counter()
+            self.func()
+            latencies.append(time.perf_counter() - op_start)
+            elapsed = time.perf_counter() - start
+        latencies.sort()
+        result = {
+            'iterations': len(latencies),
+            'ops_per_sec': len(latencies) / elapsed,
+            'mean': sum(latencies) / len(latencies),
+            'min': latencies[0],
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+        }
+        if self.nbytes:
+            result['mb_per_sec'] = self.nbytes * len(latencies) / elapsed / UNITS['M']
+        return result
+
+
+def tree_paths(root, entries, fanout=10):
+    """Return the paths of `entries` files below `root`, spread over
+    folders of at most `fanout` files, nested `fanout` folders deep"""
+    paths = []
+    for i in range(entries):
+        folders = []
+        n = i // fanout
+        while n:
+            folders.append('d%d' % (n % fanout))
+            n //= fanout
+        paths.append('/'.join([root] + folders + ['f%05d.txt' % i]))
+    return paths
+
+
+def build_benchmarks(server, repo, sizes, entry_counts, tmpdir):
+    root = repo.get_dir('/')
+    benchmarks = []
+
+    for count in entry_counts:
+        path = '/flat-%d' % count
+        server.add_files(repo.id, ['%s/f%05d.txt' % (path, i) for i in range(count)])
+        benchmarks.append(Benchmark('list_dir[%d]' % count,
+                                    lambda path=path: repo.get_dir(path)))
+
+        path = '/tree-%d' % count
+        server.add_files(repo.id, tree_paths(path, count))
+        benchmarks.append(Benchmark('walk[%d]' % count,
+                                    lambda path=path: list(repo.walk(path))))
+        benchmarks.append(Benchmark('load_tree[%d]' % count,
+                                    lambda path=path: repo.load_tree(path)))
+
+    stat_path = root.create_empty_file('stat.txt').path
+    benchmarks.append(Benchmark('stat', lambda: repo.get_file(stat_path)))
+
+    for size in sizes:
+        data = b'x' * size
+        name = 'blob-%d.bin' % size
+        benchmarks.append(Benchmark(
+            'upload[%d]' % size, nbytes=size,
+            func=lambda data=data, name=name: root.upload(io.BytesIO(data), name,
+                                                          replace=True)))
+        seaffile = root.upload(io.BytesIO(data), 'download-%d.bin' % size)
+        benchmarks.append(Benchmark('download[%d]' % size, nbytes=size,
+                                    func=seaffile.get_content))
+        if size >= SEGMENTED_MIN_SIZE:
+            benchmarks.append(Benchmark(
+                'download_to[%d,segments=4]' % size, nbytes=size,
+                func=lambda seaffile=seaffile: seaffile.download_to(os.path.join(tmpdir, 'blob'),
+                                                                    segments=4)))
+    return benchmarks
+
+
+def run(args):
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size]
+    entry_counts = [int(count) for count in args.entries.split(',') if count]
+    results = {}
+    with FakeSeafileServer(latency=args.latency) as server:
+        client = seafileapi.connect(server.url, 'bench@example.com', 'password')
+        repo = client.repos.create_repo('bench')
+        tmpdir = tempfile.mkdtemp()
+        for benchmark in build_benchmarks(server, repo, sizes, entry_counts, tmpdir):
+            if args.filter and args.filter not in benchmark.name:
+                continue
+            result = benchmark.run(args.min_time, args.max_iterations)
+            results[benchmark.name] = result
+            print('%-34s %10.1f ops/s  p50 %8.2f ms  p99 %8.2f ms' % (
+                benchmark.name, result['ops_per_sec'], result['p50'] * 1000,
+                result['p99'] * 1000))
+        total = client.stats.total
+        client.close()
+        shutil.rmtree(tmpdir)
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'latency': args.latency,
+            'requests': total.count,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print how the rates of `current` compare to `baseline`, and return
+    the names of the benchmarks which got slower by more than `threshold`"""
+    regressions = []
+    for name, result in sorted(current['results'].items()):
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        ratio = result['ops_per_sec'] / before['ops_per_sec']
+        flag = ''
+        if ratio < 1 - threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('%-34s %10.1f -> %10.1f ops/s  %+6.1f%%%s' % (
+            name, before['ops_per_sec'], result['ops_per_sec'], (ratio - 1) * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='payload sizes of the transfers (default %(default)s)')
+    parser.add_argument('--entries', default=DEFAULT_ENTRIES,
+                        help='entries of the listed folders and trees (default %(default)s)')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds added to every request by the server')
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME)
+    parser.add_argument('--max-iterations', type=int, default=DEFAULT_MAX_ITERATIONS)
+    parser.add_argument('--filter', help='only run the benchmarks whose name contains this')
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--compare', help='json results of a previous run to compare to')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative rate drop reported as a regression (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        if compare(baseline, results, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
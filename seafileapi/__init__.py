@@ -1,5 +1,6 @@
 from seafileapi.client import SeafileApiClient
+from seafileapi.aio import AsyncSeafileApiClient
 
-def connect(server, username, password):
-    client = SeafileApiClient(server, username, password)
+def connect(server, username, password, **kwargs):
+    client = SeafileApiClient(server, username, password, **kwargs)
     return client
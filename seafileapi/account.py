@@ -5,6 +5,9 @@ class Account(object):
     """
     A seafile account
     """
+    __slots__ = ('client', 'id', 'email', 'create_time', 'is_active', 'is_staff',
+                 'usage', 'total')
+
     def __init__(self, client, id, email, create_time, is_active, is_staff, usage, total):
         self.client = client
         self.id = id
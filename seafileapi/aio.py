@@ -0,0 +1,406 @@
+"""asyncio flavour of the client, built on top of aiohttp.
+
+Only the most common operations are mirrored here::
+
+    client = await seafileapi.aio.connect(server, username, password)
+    async with client:
+        repo = await client.repos.get_repo(repo_id)
+        seafdir = await repo.get_dir('/')
+        for dirent in await seafdir.ls():
+            ...
+"""
+import asyncio
+import json
+import posixpath
+import re
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from seafileapi.client import AuthenticationError
+from seafileapi.exceptions import ClientHttpError, DoesNotExist
+from seafileapi.files import ZERO_OBJ_ID
+from seafileapi.retry import RetryPolicy, is_replayable
+from seafileapi.utils import urljoin, querystr, utf8lize
+
+DEFAULT_MAX_CONCURRENCY = 100
+
+
+async def connect(server, username, password, **kwargs):
+    client = AsyncSeafileApiClient(server, username, password, **kwargs)
+    await client.login()
+    return client
+
+
+class AsyncResponse(object):
+    """A fully read response returned by :class:`AsyncSeafileApiClient`"""
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncSeafileApiClient(object):
+    """Wraps seafile web api for asyncio applications"""
+    def __init__(self, server, username=None, password=None, token=None,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, limit_per_host=0,
+                 timeout=None, retry=None):
+        """Requests are sent over a single non-blocking aiohttp session.
+
+        :param:`max_concurrency` the max number of requests in flight at the
+        same time, further requests wait for a free slot
+        :param:`limit_per_host` the max number of connections per host, 0
+        means no limit besides `max_concurrency`
+        :param:`timeout` total timeout in seconds of a single request
+        :param:`retry` the :class:`seafileapi.retry.RetryPolicy` of the
+        requests, see :class:`seafileapi.client.SeafileApiClient`
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncSeafileApiClient requires aiohttp, '
+                              'install it with "pip install seafileapi[async]"')
+        self.server = server
+        self.username = username
+        self.password = password
+        self._token = token
+        self.max_concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.retry = retry if retry is not None else RetryPolicy()
+        self._session = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._login_lock = asyncio.Lock()
+
+        self.repos = AsyncRepos(self)
+
+    def __str__(self):
+        return 'AsyncSeafileApiClient[server=%s, user=%s]' % (self.server, self.username)
+
+    __repr__ = __str__
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                                             limit_per_host=self.limit_per_host)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        await self.login()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def login(self):
+        """Retrieve the access token, unless one is known already"""
+        async with self._login_lock:
+            if self._token is None:
+                await self._get_token()
+
+    async def _get_token(self):
+        data = {
+            'username': self.username,
+            'password': self.password,
+        }
+        url = urljoin(self.server, '/api2/auth-token/')
+        async with self._semaphore:
+            async with self._get_session().post(url, data=data) as res:
+                status = res.status
+                content = await res.read()
+        if status != 200:
+            if status == 400:
+                try:
+                    resp_json = json.loads(content.decode('utf-8'))
+                    if 'non_field_errors' in resp_json:
+                        raise AuthenticationError(status, content)
+                except (TypeError, ValueError):
+                    raise ClientHttpError(status, content)
+            raise ClientHttpError(status, content)
+        token = json.loads(content.decode('utf-8'))['token']
+        assert len(token) == 40, 'The length of seahub api auth token should be 40'
+        self._token = token
+
+    async def get(self, *args, **kwargs):
+        return await self._send_request('GET', *args, **kwargs)
+
+    async def post(self, *args, **kwargs):
+        return await self._send_request('POST', *args, **kwargs)
+
+    async def put(self, *args, **kwargs):
+        return await self._send_request('PUT', *args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        return await self._send_request('DELETE', *args, **kwargs)
+
+    async def _send_request(self, method, url, **kwargs):
+        if not url.startswith('http'):
+            url = urljoin(self.server, url)
+        if self._token is None:
+            await self.login()
+
+        headers = kwargs.get('headers', {})
+        headers.setdefault('Authorization', 'Token ' + self._token)
+        kwargs['headers'] = headers
+
+        expected = kwargs.pop('expected', 200)
+        if not hasattr(expected, '__iter__'):
+            expected = (expected, )
+        resp = await self._send_with_retries(method, url, expected, kwargs)
+        if resp.status_code not in expected:
+            msg = 'Expected %s, but get %s' % \
+                  (' or '.join(map(str, expected)), resp.status_code)
+            raise ClientHttpError(resp.status_code, msg)
+
+        return resp
+
+    async def _send_with_retries(self, method, url, expected, kwargs):
+        """Send the request, and send it again as long as it fails in a way
+        the retry policy allows to retry"""
+        replayable = is_replayable(kwargs.get('data'))
+        attempt = 1
+        while True:
+            try:
+                async with self._semaphore:
+                    async with self._get_session().request(method, url, **kwargs) as resp:
+                        content = await resp.read()
+                        resp = AsyncResponse(resp.status, resp.headers, content)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if not replayable or not self.retry.should_retry(method, attempt):
+                    raise
+                delay = self.retry.get_delay(attempt)
+            else:
+                if resp.status_code in expected or not replayable or \
+                   not self.retry.should_retry(method, attempt, resp.status_code):
+                    return resp
+                delay = self.retry.get_delay(attempt, resp.headers.get('Retry-After'))
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def _raise_does_not_exist(msg, coro):
+    """Await `coro`, turning a http 404 response into a :exc:`DoesNotExist`"""
+    try:
+        return await coro
+    except ClientHttpError as e:
+        if e.code == 404:
+            raise DoesNotExist(msg)
+        raise
+
+
+class AsyncRepos(object):
+    def __init__(self, client):
+        self.client = client
+
+    async def get_repo(self, repo_id):
+        """Get the repo which has the id `repo_id`.
+
+        Raises :exc:`DoesNotExist` if no such repo exists.
+        """
+        resp = await _raise_does_not_exist('The requested library does not exist',
+                                           self.client.get('/api2/repos/' + repo_id))
+        return AsyncRepo.from_json(self.client, resp.json())
+
+    async def list_repos(self, type=None):
+        params = {}
+        if type is not None:
+            params['type'] = type
+        resp = await self.client.get('/api2/repos/', params=params)
+        return [AsyncRepo.from_json(self.client, j) for j in resp.json()]
+
+
+class AsyncRepo(object):
+    """
+    A seafile library, see :class:`seafileapi.repo.Repo`
+    """
+    def __init__(self, client, repo_id, repo_name,
+                 encrypted, owner, perm):
+        self.client = client
+        self.id = repo_id
+        self.name = repo_name
+        self.encrypted = encrypted
+        self.owner = owner
+        self.perm = perm
+
+    def __repr__(self):
+        return '<{} {} "{}">'.format(self.__class__.__name__,
+                                     self.id is not None and self.id[:6] or None,
+                                     self.name)
+
+    @classmethod
+    def from_json(cls, client, repo_json):
+        repo_json = utf8lize(repo_json)
+        return cls(client, repo_json['id'], repo_json['name'],
+                   repo_json['encrypted'], repo_json['owner'],
+                   repo_json['permission'])
+
+    def is_readonly(self):
+        return 'w' not in self.perm
+
+    async def get_file(self, path):
+        """Get the file object located in `path` in this repo.
+
+        Return a :class:`AsyncSeafFile` object
+        """
+        assert path.startswith('/')
+        url = '/api2/repos/%s/file/detail/' % self.id + querystr(p=path)
+        resp = await _raise_does_not_exist('The requested file does not exist',
+                                           self.client.get(url))
+        file_json = resp.json()
+        return AsyncSeafFile(self.id, path, file_json['id'], file_json['size'], self.client)
+
+    async def get_dir(self, path, recursive=True):
+        """Get the dir object located in `path` in this repo.
+
+        Return a :class:`AsyncSeafDir` object
+        """
+        assert path.startswith('/')
+        url = '/api2/repos/%s/dir/' % self.id + querystr(p=path)
+        resp = await _raise_does_not_exist('The requested dir does not exist',
+                                           self.client.get(url))
+        seafdir = AsyncSeafDir(self.id, path, resp.headers['oid'], 0, self.client)
+        if recursive:
+            seafdir.load_entries(resp.json())
+        return seafdir
+
+
+class _AsyncDirentBase(object):
+    """Base class for :class:`AsyncSeafFile` and :class:`AsyncSeafDir`"""
+    isdir = None
+
+    def __init__(self, repo_id, path, object_id, size=0, client=None):
+        self.client = client
+        self.repo_id = repo_id
+        self.path = path
+        self.id = object_id
+        self.size = size
+
+    def __repr__(self):
+        return '<{} repo={} "{}">'.format(self.__class__.__name__,
+                                          self.repo_id[:6],
+                                          self.path)
+
+    @property
+    def name(self):
+        return posixpath.basename(self.path)
+
+
+class AsyncSeafDir(_AsyncDirentBase):
+    isdir = True
+
+    def __init__(self, *args, **kwargs):
+        entries = kwargs.pop('entries', None)
+        super(AsyncSeafDir, self).__init__(*args, **kwargs)
+        self.entries = entries
+
+    async def ls(self, force_refresh=False):
+        """List the entries in this dir.
+
+        Return a list of objects of class :class:`AsyncSeafFile` or
+        :class:`AsyncSeafDir`.
+        """
+        if self.entries is None or force_refresh:
+            url = '/api2/repos/%s/dir/' % self.repo_id + querystr(p=self.path)
+            resp = await self.client.get(url)
+            self.load_entries(resp.json())
+
+        return self.entries
+
+    def load_entries(self, dirents_json):
+        self.entries = [self._load_dirent(entry_json) for entry_json in dirents_json]
+
+    def _load_dirent(self, dirent_json):
+        path = posixpath.join(self.path, dirent_json['name'])
+        if dirent_json['type'] == 'file':
+            return AsyncSeafFile(self.repo_id, path, dirent_json['id'], dirent_json['size'], self.client)
+        else:
+            return AsyncSeafDir(self.repo_id, path, dirent_json['id'], 0, self.client)
+
+    async def mkdir(self, name):
+        """Create a new sub folder right under this dir.
+
+        Return a :class:`AsyncSeafDir` object of the newly created sub folder.
+        """
+        path = posixpath.join(self.path, name)
+        url = '/api2/repos/%s/dir/' % self.repo_id + querystr(p=path, reloaddir='true')
+        resp = await self.client.post(url, data={'operation': 'mkdir'})
+        self.id = resp.headers['oid']
+        self.load_entries(resp.json())
+        return AsyncSeafDir(self.repo_id, path, ZERO_OBJ_ID, 0, self.client)
+
+    async def upload(self, fileobj, filename):
+        """Upload a file to this folder.
+
+        :param:fileobj :class:`File` like object, `str` or `bytes`
+        :param:filename The name of the file
+
+        Return a :class:`AsyncSeafFile` object of the newly uploaded file.
+        """
+        if isinstance(fileobj, str):
+            fileobj = fileobj.encode('utf-8')
+        upload_url = await self._get_upload_link()
+        form = aiohttp.FormData()
+        form.add_field('file', fileobj, filename=filename,
+                       content_type='application/octet-stream')
+        form.add_field('parent_dir', self.path)
+        await self.client.post(upload_url, data=form)
+
+        return await self.get_file(posixpath.join(self.path, filename))
+
+    async def get_file(self, path):
+        """Get the file object located in `path` in this repo.
+        Return a :class:`AsyncSeafFile` object
+        """
+        assert path.startswith('/')
+        url = '/api2/repos/%s/file/detail/' % self.repo_id + querystr(p=path)
+        resp = await _raise_does_not_exist('The requested file does not exist',
+                                           self.client.get(url))
+        file_json = resp.json()
+        return AsyncSeafFile(self.repo_id, path, file_json['id'], file_json['size'], self.client)
+
+    async def _get_upload_link(self):
+        url = '/api2/repos/%s/upload-link/' % self.repo_id
+        resp = await self.client.get(url)
+        return re.match(r'"(.*)"', resp.text).group(1)
+
+    def __str__(self):
+        return 'AsyncSeafDir[repo=%s,path=%s]' % \
+            (self.repo_id[:6], self.path)
+
+    __repr__ = __str__
+
+
+class AsyncSeafFile(_AsyncDirentBase):
+    isdir = False
+
+    def __str__(self):
+        return 'AsyncSeafFile[repo=%s,path=%s,size=%s]' % \
+            (self.repo_id[:6], self.path, self.size)
+
+    async def _get_download_link(self):
+        url = '/api2/repos/%s/file/' % self.repo_id + querystr(p=self.path)
+        resp = await self.client.get(url)
+        return re.match(r'"(.*)"', resp.text).group(1)
+
+    async def get_content(self):
+        """Get the content of the file"""
+        url = await self._get_download_link()
+        resp = await self.client.get(url)
+        return resp.content
+
+    __repr__ = __str__
@@ -0,0 +1,387 @@
+import hashlib
+import json
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_LINK_TTL = 30 * 60
+DEFAULT_LINK_CACHE_SIZE = 1024
+# Download links are per file rather than per library
+DEFAULT_DOWNLOAD_LINK_CACHE_SIZE = 16384
+DEFAULT_LISTING_CACHE_BYTES = 32 * 1024 * 1024
+DEFAULT_TOKEN_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'seafileapi',
+                                        'tokens.json')
+DEFAULT_CONTENT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'seafileapi',
+                                          'contents')
+DEFAULT_CONTENT_CACHE_BYTES = 1024 * 1024 * 1024
+# Eviction frees space down to this fraction of max_bytes, so that it doesn't
+# run again on the next write
+CONTENT_CACHE_LOW_WATER = 0.9
+# Temp files older than this are left over by a crashed process
+STALE_TMP_AGE = 60 * 60
+
+
+class LinkCache(object):
+    """A thread safe cache of fileserver links, each of which expires `ttl`
+    seconds after it was added.
+
+    At most `maxsize` links are kept, the least recently used ones are
+    dropped first. A `ttl` of 0 disables the cache.
+    """
+    def __init__(self, ttl=DEFAULT_LINK_TTL, maxsize=DEFAULT_LINK_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._links = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._links)
+
+    def get(self, key):
+        """Return the link cached for `key`, or None if there is none or it
+        has expired"""
+        with self._lock:
+            entry = self._links.get(key)
+            if entry is None:
+                return None
+            link, expires_at = entry
+            if expires_at <= time.time():
+                del self._links[key]
+                return None
+            self._links.move_to_end(key)
+            return link
+
+    def set(self, key, link, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._links[key] = (link, time.time() + ttl)
+            self._links.move_to_end(key)
+            while len(self._links) > self.maxsize:
+                self._links.popitem(last=False)
+
+    def invalidate(self, key, link=None):
+        """Forget the link cached for `key`. If `link` is given, only forget
+        it if it is still the cached one."""
+        with self._lock:
+            entry = self._links.get(key)
+            if entry is not None and (link is None or entry[0] == link):
+                del self._links[key]
+
+    def clear(self):
+        with self._lock:
+            self._links.clear()
+
+
+class ListingCache(object):
+    """A thread safe cache of directory listings, keyed by `(repo_id, path)`.
+
+    Each entry keeps the object id of the directory along with the raw
+    listing returned by the server, so that the listing can be revalidated
+    by asking the server whether the directory still has the same id.
+
+    The least recently used entries are dropped once the listings take more
+    than `max_bytes` in total. A `max_bytes` of 0 disables the cache.
+    """
+    def __init__(self, max_bytes=DEFAULT_LISTING_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._listings)
+
+    def get(self, key):
+        """Return the `(oid, listing)` tuple cached for `key`, or None"""
+        with self._lock:
+            entry = self._listings.get(key)
+            if entry is not None:
+                self._listings.move_to_end(key)
+            return entry
+
+    def set(self, key, oid, listing):
+        with self._lock:
+            self._pop(key)
+            if len(listing) > self.max_bytes:
+                return
+            self._listings[key] = (oid, listing)
+            self.size += len(listing)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._listings.popitem(last=False)
+                self.size -= len(evicted)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self._listings.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+class TokenCache(object):
+    """A cache of auth tokens in the file `path`, shared by the processes of
+    a user, so that short lived ones don't need to log in every time.
+
+    Tokens are keyed by a hash of the server and the username. The file is
+    only readable by its owner and is replaced atomically. A file that other
+    users can read is ignored, and replaced on the next write.
+    """
+    def __init__(self, path=DEFAULT_TOKEN_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<{} "{}">'.format(self.__class__.__name__, self.path)
+
+    @staticmethod
+    def _key(server, username):
+        key = '%s\n%s' % (server.rstrip('/'), username)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get(self, server, username):
+        """Return the token cached for `username` on `server`, or None"""
+        return self._load().get(self._key(server, username))
+
+    def set(self, server, username, token):
+        with self._lock:
+            tokens = self._load()
+            tokens[self._key(server, username)] = token
+            self._save(tokens)
+
+    def invalidate(self, server, username):
+        with self._lock:
+            tokens = self._load()
+            if tokens.pop(self._key(server, username), None) is not None:
+                self._save(tokens)
+
+    def _load(self):
+        try:
+            with open(self.path) as fp:
+                if os.name == 'posix' and \
+                   stat.S_IMODE(os.fstat(fp.fileno()).st_mode) & 0o077:
+                    return {}
+                tokens = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return {}
+        return tokens if isinstance(tokens, dict) else {}
+
+    def _save(self, tokens):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        tmp_path = '%s.%d.%d.tmp' % (self.path, os.getpid(), threading.get_ident())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(tokens, fp)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class ContentCache(object):
+    """A cache of file contents on the local disk, in the folder `path`,
+    keyed by the object id of the files.
+
+    An object id always designates the same content, so entries never go
+    stale and need no revalidation. Entries are written to a temporary file
+    and renamed once complete, so that the processes sharing the folder
+    never see a partial entry.
+
+    Reading an entry refreshes its mtime. Once the entries take more than
+    `max_bytes`, the least recently used ones are removed. Each process
+    keeps an estimate of the size of the folder and only scans it when the
+    estimate gets over `max_bytes`.
+    """
+    def __init__(self, path=DEFAULT_CONTENT_CACHE_PATH, max_bytes=DEFAULT_CONTENT_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<{} "{}">'.format(self.__class__.__name__, self.path)
+
+    def __contains__(self, obj_id):
+        return os.path.exists(self._entry_path(obj_id))
+
+    def _entry_path(self, obj_id):
+        return os.path.join(self.path, obj_id[:2], obj_id)
+
+    def open(self, obj_id):
+        """Return the cached content of `obj_id` as a binary file object, or
+        None if it is not cached"""
+        entry_path = self._entry_path(obj_id)
+        try:
+            fp = open(entry_path, 'rb')
+        except (IOError, OSError):
+            return None
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            # Evicted by another process meanwhile, the open file is still
+            # readable
+            pass
+        return fp
+
+    def get(self, obj_id):
+        """Return the cached content of `obj_id`, or None"""
+        fp = self.open(obj_id)
+        if fp is None:
+            return None
+        with fp:
+            return fp.read()
+
+    def set(self, obj_id, data):
+        writer = self.writer(obj_id)
+        writer.write(data)
+        writer.commit()
+
+    def writer(self, obj_id, size=None):
+        """Return a :class:`ContentWriter` to add the content of `obj_id`
+        piece by piece. If `size` is given, the entry is only added if that
+        many bytes were written."""
+        return ContentWriter(self, obj_id, size)
+
+    def invalidate(self, obj_id):
+        try:
+            os.remove(self._entry_path(obj_id))
+        except OSError:
+            pass
+
+    def clear(self):
+        for entry_path, _, _ in self._scan():
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+        with self._lock:
+            self._size = 0
+
+    def _add(self, tmp_path, obj_id, size):
+        entry_path = self._entry_path(obj_id)
+        os.replace(tmp_path, entry_path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry[1] for entry in self._scan())
+            else:
+                self._size += size
+            if self._size <= self.max_bytes:
+                return
+            self._size = self._evict()
+
+    def _scan(self):
+        """Return the `(path, size, mtime)` of the entries, and remove the
+        temp files left over by crashed processes"""
+        entries = []
+        now = time.time()
+        try:
+            folders = os.listdir(self.path)
+        except OSError:
+            return entries
+        for folder in folders:
+            folder = os.path.join(self.path, folder)
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            for name in names:
+                entry_path = os.path.join(folder, name)
+                try:
+                    st = os.stat(entry_path)
+                except OSError:
+                    continue
+                if name.endswith('.tmp'):
+                    if now - st.st_mtime > STALE_TMP_AGE:
+                        try:
+                            os.remove(entry_path)
+                        except OSError:
+                            pass
+                    continue
+                entries.append((entry_path, st.st_size, st.st_mtime))
+        return entries
+
+    def _evict(self):
+        """Remove the least recently used entries until they take less than
+        the low water mark, and return the size left"""
+        entries = self._scan()
+        size = sum(entry[1] for entry in entries)
+        target = self.max_bytes * CONTENT_CACHE_LOW_WATER
+        for entry_path, entry_size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if size <= target:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                # Already evicted by another process, or still open on Windows
+                continue
+            size -= entry_size
+        return size
+
+
+class ContentWriter(object):
+    """Writes an entry of a :class:`ContentCache` to a temporary file, which
+    is only added to the cache by :meth:`commit`"""
+    def __init__(self, cache, obj_id, size=None):
+        self.cache = cache
+        self.obj_id = obj_id
+        self.size = size
+        self.written = 0
+        folder = os.path.dirname(cache._entry_path(obj_id))
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # Created by another process meanwhile
+                if not os.path.isdir(folder):
+                    raise
+        self._tmp_path = '%s.%d.%d.tmp' % (cache._entry_path(obj_id), os.getpid(),
+                                          threading.get_ident())
+        self._fp = open(self._tmp_path, 'wb')
+
+    def write(self, data):
+        self._fp.write(data)
+        self.written += len(data)
+
+    def commit(self):
+        """Add the entry to the cache, unless fewer bytes than expected were
+        written"""
+        if self._fp is None:
+            return
+        self._fp.close()
+        self._fp = None
+        if self.size is not None and self.written != self.size:
+            self._remove()
+            return
+        try:
+            self.cache._add(self._tmp_path, self.obj_id, self.written)
+        except BaseException:
+            self._remove()
+            raise
+
+    def abort(self):
+        if self._fp is None:
+            return
+        self._fp.close()
+        self._fp = None
+        self._remove()
+
+    def _remove(self):
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
@@ -1,6 +1,16 @@
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+from six.moves.urllib.parse import urlparse
 from seafileapi.utils import urljoin
+from seafileapi.cache import LinkCache, ListingCache, DEFAULT_LINK_TTL, \
+    DEFAULT_LISTING_CACHE_BYTES, DEFAULT_DOWNLOAD_LINK_CACHE_SIZE
 from seafileapi.exceptions import ClientHttpError
+from seafileapi.retry import RetryPolicy, is_replayable
+from seafileapi.throttle import Throttle
+from seafileapi.stats import ClientStats
 from seafileapi.account import AccountApi
 from seafileapi.repos import Repos
 from seafileapi.groups import Groups, AdminGroups
@@ -8,19 +18,129 @@ from seafileapi.ping import Ping
 from seafileapi.admin import SeafileAdmin
 
 
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+
 class AuthenticationError(ClientHttpError):
     """Authentication error occurred while retrieving access token"""
 
 
+def _make_session(pool_connections, pool_maxsize, pool_block, keep_alive):
+    """Create a :class:`requests.Session` whose connections are kept in a
+    pool of `pool_connections` hosts with at most `pool_maxsize` connections
+    per host.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize,
+                          pool_block=pool_block)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def _release_on_close(resp, limits, status):
+    """Release the throttle `limits` once the streamed response `resp` is
+    closed, as its body is only transferred meanwhile"""
+    close = resp.close
+    lock = threading.Lock()
+
+    def close_and_release():
+        with lock:
+            pending = limits[:]
+            del limits[:]
+        try:
+            close()
+        finally:
+            for limit in reversed(pending):
+                limit.release(status)
+
+    resp.close = close_and_release
+
+
 class SeafileApiClient(object):
     """Wraps seafile web api"""
-    def __init__(self, server, username=None, password=None, token=None):
+    def __init__(self, server, username=None, password=None, token=None,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 fileserver_pool_connections=None,
+                 fileserver_pool_maxsize=None,
+                 pool_block=False, keep_alive=True,
+                 upload_link_ttl=DEFAULT_LINK_TTL,
+                 download_link_ttl=DEFAULT_LINK_TTL,
+                 listing_cache_size=DEFAULT_LISTING_CACHE_BYTES,
+                 retry=None, throttle=None, token_cache=None, stats=True,
+                 content_cache=None):
         """Wraps various basic operations to interact with seahub http api.
+
+        Requests to seahub and to the fileserver (seafhttp) go through two
+        separate connection pools, which are shared by all the subsystems
+        (repos, files, groups, admin) of this client.
+
+        :param:`pool_connections` the number of hosts to keep a pool for
+        :param:`pool_maxsize` the max number of connections kept per host
+        :param:`fileserver_pool_connections` same as `pool_connections` for
+        the fileserver pool, defaults to `pool_connections`
+        :param:`fileserver_pool_maxsize` same as `pool_maxsize` for the
+        fileserver pool, defaults to `pool_maxsize`
+        :param:`pool_block` whether to wait for a free connection instead of
+        opening an extra one when a host pool is exhausted
+        :param:`keep_alive` whether to reuse connections between requests
+        :param:`upload_link_ttl` how many seconds the upload and update links
+        of a repo are reused before asking seahub for new ones, 0 disables
+        the reuse
+        :param:`download_link_ttl` how many seconds the download link of a
+        file is reused, as long as the file keeps the same object id, 0
+        disables the reuse
+        :param:`listing_cache_size` how many bytes of directory listings to
+        keep for conditional revalidation, 0 disables the cache
+        :param:`retry` the :class:`seafileapi.retry.RetryPolicy` of the
+        requests sent to seahub and to the fileserver, by default idempotent
+        requests are retried on 429, 502, 503 and 504 responses and on
+        connection errors. Pass `seafileapi.retry.NO_RETRY` to disable it.
+        :param:`throttle` the :class:`seafileapi.throttle.Throttle` limiting
+        the rate and concurrency of requests, by default the rate only adapts
+        to the 429 responses of the server. Pass
+        `seafileapi.throttle.NO_THROTTLE` to disable it.
+        :param:`token_cache` a :class:`seafileapi.cache.TokenCache` to reuse
+        the auth token of a previous login instead of logging in again. A
+        cached token is not checked upfront: if a request gets 401 because
+        it expired, the client logs in again and resends the request.
+        :param:`stats` whether to count the requests in :attr:`stats`, a
+        :class:`seafileapi.stats.ClientStats`, which can also be turned on
+        and off later
+        :param:`content_cache` a :class:`seafileapi.cache.ContentCache` to
+        keep the contents of downloaded files on the local disk, keyed by
+        their object ids, and read them from there the next times
         """
         self.server = server
         self.username = username
         self.password = password
         self._token = token
+        self._token_lock = threading.Lock()
+        self.token_cache = token_cache
+        self.content_cache = content_cache
+        self._server_netloc = urlparse(server).netloc
+
+        if fileserver_pool_connections is None:
+            fileserver_pool_connections = pool_connections
+        if fileserver_pool_maxsize is None:
+            fileserver_pool_maxsize = pool_maxsize
+        self.session = _make_session(pool_connections, pool_maxsize,
+                                     pool_block, keep_alive)
+        self.fileserver_session = _make_session(fileserver_pool_connections,
+                                                fileserver_pool_maxsize,
+                                                pool_block, keep_alive)
+        self.upload_links = LinkCache(ttl=upload_link_ttl)
+        self.download_links = LinkCache(ttl=download_link_ttl,
+                                        maxsize=DEFAULT_DOWNLOAD_LINK_CACHE_SIZE)
+        self.listings = ListingCache(max_bytes=listing_cache_size)
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.throttle = throttle if throttle is not None else Throttle()
+        self.stats = ClientStats(enabled=stats)
 
         self.account = AccountApi(self)
         self.repos = Repos(self)
@@ -29,7 +149,9 @@ class SeafileApiClient(object):
         self.ping = Ping(self)
         self.admin  = SeafileAdmin(self)
 
-        if token is None:
+        if token is None and token_cache is not None:
+            self._token = token_cache.get(server, username)
+        if self._token is None:
             self._get_token()
 
     def _get_token(self):
@@ -38,7 +160,7 @@ class SeafileApiClient(object):
             'password': self.password,
         }
         url = urljoin(self.server, '/api2/auth-token/')
-        res = requests.post(url, data=data)
+        res = self.session.post(url, data=data)
         if res.status_code != 200:
             if res.status_code == 400:
                 # Possible auth error
@@ -54,12 +176,48 @@ class SeafileApiClient(object):
         token = res.json()['token']
         assert len(token) == 40, 'The length of seahub api auth token should be 40'
         self._token = token
+        if self.token_cache is not None:
+            self.token_cache.set(self.server, self.username, token)
+
+    def _refresh_token(self, stale_token):
+        """Log in again after `stale_token` was rejected, unless another
+        thread did already"""
+        with self._token_lock:
+            if self._token != stale_token:
+                return
+            if self.token_cache is not None:
+                self.token_cache.invalidate(self.server, self.username)
+            self._get_token()
 
     def __str__(self):
         return 'SeafileApiClient[server=%s, user=%s]' % (self.server, self.username)
 
     __repr__ = __str__
 
+    def close(self):
+        """Close all the pooled connections of this client"""
+        self.session.close()
+        self.fileserver_session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_fileserver_url(self, url):
+        """Whether `url` points to the fileserver (seafhttp) rather than to
+        seahub"""
+        parsed = urlparse(url)
+        if parsed.path == '/seafhttp' or parsed.path.startswith('/seafhttp/'):
+            return True
+        return bool(parsed.netloc) and parsed.netloc != self._server_netloc
+
+    def _session_for(self, url):
+        if self.is_fileserver_url(url):
+            return self.fileserver_session
+        return self.session
+
     def get(self, *args, **kwargs):
         return self._send_request('GET', *args, **kwargs)
 
@@ -77,18 +235,100 @@ class SeafileApiClient(object):
             url = urljoin(self.server, url)
 
         headers = kwargs.get('headers', {})
-        headers.setdefault('Authorization', 'Token ' + self._token)
+        token = self._token
+        own_auth = 'Authorization' not in headers
+        headers.setdefault('Authorization', 'Token ' + token)
         kwargs['headers'] = headers
 
         expected = kwargs.pop('expected', 200)
         if not hasattr(expected, '__iter__'):
             expected = (expected, )
-        resp = requests.request(method, url, **kwargs)
+        resp = self._send_with_retries(method, url, expected, kwargs)
+        if resp.status_code == 401 and 401 not in expected and own_auth and \
+           self.password is not None and not self.is_fileserver_url(url) and \
+           is_replayable(kwargs.get('data')):
+            # The token expired or was revoked
+            resp.close()
+            self._refresh_token(token)
+            headers['Authorization'] = 'Token ' + self._token
+            resp = self._send_with_retries(method, url, expected, kwargs)
         if resp.status_code not in expected:
+            resp.close()
             msg = 'Expected %s, but get %s' % \
                   (' or '.join(map(str, expected)), resp.status_code)
             raise ClientHttpError(resp.status_code, msg)
 
         return resp
 
+    def _send_with_retries(self, method, url, expected, kwargs):
+        """Send the request, and send it again as long as it fails in a way
+        the retry policy allows to retry"""
+        fileserver = self.is_fileserver_url(url)
+        session = self.fileserver_session if fileserver else self.session
+        limits = self.throttle.limits_for(method, fileserver)
+        replayable = is_replayable(kwargs.get('data'))
+        record = self.stats.request_started(method, url)
+        attempt = 1
+        while True:
+            try:
+                resp = self._send_throttled(session, method, url, limits, kwargs, record)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not replayable or not self.retry.should_retry(method, attempt):
+                    if record is not None:
+                        record.attempts, record.error = attempt, e
+                        self.stats.request_ended(record)
+                    raise
+                delay = self.retry.get_delay(attempt)
+            else:
+                if resp.status_code in expected or not replayable or \
+                   not self.retry.should_retry(method, attempt, resp.status_code):
+                    if record is not None:
+                        record.attempts = attempt
+                        self._end_record(record, resp, kwargs.get('stream'))
+                    return resp
+                delay = self.retry.get_delay(attempt, resp.headers.get('Retry-After'))
+                resp.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _end_record(self, record, resp, stream):
+        record.status = resp.status_code
+        request = getattr(resp, 'request', None)
+        if request is not None:
+            record.bytes_sent = int(request.headers.get('Content-Length') or 0)
+        if stream or getattr(resp, '_content', False) is False:
+            # Don't read a streamed body, count what the server announced
+            record.bytes_received = int(resp.headers.get('Content-Length') or 0)
+        else:
+            record.bytes_received = len(resp.content)
+        self.stats.request_ended(record)
+
+    def _send_throttled(self, session, method, url, limits, kwargs, record=None):
+        """Send the request once, waiting for the throttle `limits` to allow
+        it, and set the `latency` of its stats `record`.
+
+        The limits of a streamed request are held until its response is
+        closed, so that the transfer of its body counts as in flight.
+        """
+        acquired = []
+        status = None
+        try:
+            for limit in limits:
+                limit.acquire()
+                acquired.append(limit)
+            start = time.time()
+            try:
+                resp = session.request(method, url, **kwargs)
+            finally:
+                if record is not None:
+                    record.latency = time.time() - start
+            status = resp.status_code
+            if kwargs.get('stream') and acquired:
+                _release_on_close(resp, acquired, status)
+                acquired = []
+            return resp
+        finally:
+            for limit in reversed(acquired):
+                limit.release(status)
+
 
@@ -1,16 +1,348 @@
+import binascii
+import hashlib
 import io
+import itertools
+import json
 import os
 import posixpath
 import re
-from seafileapi.utils import querystr, raise_does_not_exist
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from requests import RequestException
+from six.moves.urllib.parse import quote, urlencode
+from seafileapi.exceptions import ClientHttpError, DoesNotExist, OperationError
+from seafileapi.multipart import MultipartEncoder, UPLOAD_CHUNK_SIZE, content_size
+from seafileapi.streams import DownloadStream, CachedStream, RangeReader, \
+    DEFAULT_CHUNK_SIZE, DEFAULT_HASH_NAME, DEFAULT_BLOCK_SIZE, DEFAULT_READAHEAD, \
+    DEFAULT_CACHE_BLOCKS
+from seafileapi.transfer import run_batches, run_transfers, DEFAULT_TRANSFER_WORKERS
+from seafileapi.utils import querystr, raise_does_not_exist, iter_json_array
+from seafileapi.zipstream import extract_stream
 
 ZERO_OBJ_ID = '0000000000000000000000000000000000000000'
+RESUMABLE_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_BATCH_COUNT = 100
+UPLOAD_BATCH_BYTES = 16 * 1024 * 1024
+# What the fileserver answers when the token of an upload/update link expired
+STALE_LINK_CODES = (403, )
+# Same for a download link, whose token is looked up before the file
+STALE_DOWNLOAD_LINK_CODES = (400, 403)
+DOWNLOAD_MANIFEST_NAME = '.seafile-manifest.json'
+# What older servers answer to a recursive dir listing
+RECURSIVE_LISTING_UNSUPPORTED_CODES = (400, 404)
+LISTING_CHUNK_SIZE = 64 * 1024
+BATCH_COPY_MOVE_SIZE = 1000
+DELETE_BATCH_SIZE = 1000
+TASK_POLL_INTERVAL = 0.1
+TASK_POLL_MAX_INTERVAL = 2
+# Segments of a segmented download are at least that large
+MIN_SEGMENT_SIZE = 1024 * 1024
+SEGMENT_ATTEMPTS = 3
+
+def _load_upload_state(state_path, state):
+    """Return the offset recorded in the resume state file `state_path`, or
+    None if there is none or it was recorded for another upload than
+    `state`"""
+    try:
+        with open(state_path) as fp:
+            saved = json.load(fp)
+    except (IOError, OSError, ValueError):
+        return None
+    if any(saved.get(key) != value for key, value in state.items()):
+        return None
+    return saved.get('offset')
+
+def _write_json(path, obj):
+    """Atomically replace the file `path` with `obj` serialized in JSON"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fp:
+        json.dump(obj, fp)
+    os.replace(tmp_path, path)
+
+def _load_manifest(manifest_path):
+    try:
+        with open(manifest_path) as fp:
+            return json.load(fp)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def _copy_stream(stream, fileobj, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Copy the readable `stream` to `fileobj`, and return the number of
+    bytes copied"""
+    size = 0
+    for chunk in stream.iter_chunks(chunk_size):
+        fileobj.write(chunk)
+        size += len(chunk)
+    return size
+
+def _file_checksum(path, hash_name, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return the `hash_name` hex digest of the local file `path`, or None if
+    `hash_name` is None"""
+    if not hash_name:
+        return None
+    hasher = hashlib.new(hash_name)
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def _content_range_total(resp):
+    """Return the total size of the content from the Content-Range header
+    of a partial response, or None if it isn't known"""
+    match = re.match(r'bytes \d+-\d+/(\d+)$', resp.headers.get('Content-Range', ''))
+    return int(match.group(1)) if match else None
+
+def _list_dir(client, repo_id, path):
+    """List the folder `path` of repo `repo_id`.
+
+    A listing cached in `client.listings` is revalidated by sending its
+    object id along, in which case the server only answers "uptodate" if the
+    folder didn't change.
+
+    Return a `(oid, dirents_json)` tuple.
+    """
+    key = (repo_id, path)
+    cached = client.listings.get(key)
+    params = {'p': path}
+    if cached is not None:
+        params['oid'] = cached[0]
+    resp = client.get('/api2/repos/%s/dir/' % repo_id + querystr(**params))
+    if cached is not None and resp.content.strip() == b'"uptodate"':
+        return cached[0], json.loads(cached[1].decode('utf-8'))
+
+    oid = resp.headers['oid']
+    client.listings.set(key, oid, resp.content)
+    return oid, resp.json()
+
+def _parent_dir(dirent_json):
+    """Return the normalized `parent_dir` of a dirent of a recursive listing"""
+    return dirent_json['parent_dir'].rstrip('/') or '/'
+
+def _parse_mtime(mtime):
+    """Return the `mtime` of a dirent as a timestamp. The api2 listings give
+    it as a timestamp already, the v2.1 ones as an ISO 8601 string."""
+    if not mtime:
+        return 0
+    if isinstance(mtime, int):
+        return mtime
+    try:
+        return int(datetime.strptime(mtime, '%Y-%m-%dT%H:%M:%S%z').timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+def _iter_json_response(resp, chunks, key=None):
+    """Yield the items of the JSON array in the body of the streamed
+    response `resp` as they are received"""
+    try:
+        for item in iter_json_array(chunks, key):
+            yield item
+    finally:
+        resp.close()
+
+def _iter_dir(client, repo_id, path):
+    """Like :func:`_list_dir`, but the listing is parsed as it is received
+    instead of being loaded at once.
+
+    A listing cached in `client.listings` is still revalidated and reused,
+    but the streamed ones aren't added to it, to keep memory flat.
+
+    Return a `(oid, dirents_json)` tuple, where `dirents_json` is an iterator.
+    """
+    key = (repo_id, path)
+    cached = client.listings.get(key)
+    params = {'p': path}
+    if cached is not None:
+        params['oid'] = cached[0]
+    resp = client.get('/api2/repos/%s/dir/' % repo_id + querystr(**params), stream=True)
+    chunks = resp.iter_content(LISTING_CHUNK_SIZE)
+    if cached is not None:
+        first = next(chunks, b'')
+        if first.strip() == b'"uptodate"':
+            resp.close()
+            return cached[0], iter_json_array([cached[1]])
+        client.listings.invalidate(key)
+        chunks = itertools.chain([first], chunks)
+    return resp.headers['oid'], _iter_json_response(resp, chunks)
+
+def _wait_for_task(client, task_id, timeout=None):
+    """Wait for the copy/move task `task_id` to complete, polling its
+    progress less and less often.
+
+    Raises :exc:`OperationError` if the task fails, is canceled, or doesn't
+    complete within `timeout` seconds.
+    """
+    url = '/api/v2.1/query-copy-move-progress/' + querystr(task_id=task_id)
+    deadline = None if timeout is None else time.time() + timeout
+    interval = TASK_POLL_INTERVAL
+    while True:
+        progress = client.get(url).json()
+        if progress.get('failed') or progress.get('canceled'):
+            raise OperationError('Task %s failed: %s' % (
+                task_id, progress.get('failed_reason') or 'canceled'))
+        if progress.get('done'):
+            return progress
+        if deadline is not None and time.time() + interval > deadline:
+            raise OperationError('Task %s did not complete in %s seconds' % (task_id, timeout))
+        time.sleep(interval)
+        interval = min(interval * 2, TASK_POLL_MAX_INTERVAL)
+
+def _batch_copy_move(client, op, src_repo_id, src_dir, names, dst_repo_id, dst_dir,
+                     batch_size=BATCH_COPY_MOVE_SIZE, timeout=None):
+    """Copy or move (`op`) the dirents `names` of a folder into another one
+    with the batch copy/move api, see :meth:`seafileapi.repo.Repo.batch_copy`.
+    """
+    dirents = list(names)
+    if not all(isinstance(dirent, _SeafDirentBase) for dirent in dirents):
+        _, dirents_json = _list_dir(client, src_repo_id, src_dir)
+        by_name = {dirent_json['name']: dirent_json for dirent_json in dirents_json}
+        src = SeafDir(src_repo_id, src_dir, ZERO_OBJ_ID, 0, client)
+        for i, name in enumerate(dirents):
+            if isinstance(name, _SeafDirentBase):
+                continue
+            if name not in by_name:
+                raise DoesNotExist('%s does not exist in %s' % (name, src_dir))
+            dirents[i] = src._load_dirent(by_name[name])
+
+    # Within a repo the batch runs right away, across repos it is queued as
+    # a background task
+    mode = 'sync' if src_repo_id == dst_repo_id else 'async'
+    url = '/api/v2.1/repos/%s-batch-%s-item/' % (mode, op)
+    task_ids = []
+    for start in range(0, len(dirents), batch_size):
+        data = {
+            'src_repo_id': src_repo_id,
+            'src_parent_dir': src_dir,
+            'dst_repo_id': dst_repo_id,
+            'dst_parent_dir': dst_dir,
+            'src_dirents': [dirent.name for dirent in dirents[start:start + batch_size]],
+        }
+        task_id = client.post(url, json=data).json().get('task_id')
+        if task_id:
+            task_ids.append(task_id)
+    for task_id in task_ids:
+        _wait_for_task(client, task_id, timeout)
+
+    if op == 'move':
+        for dirent in dirents:
+            dirent._moved_to(dst_repo_id, dst_dir)
+        return dirents
+    return [type(dirent)(dst_repo_id, posixpath.join(dst_dir, dirent.name),
+                         dirent.id, dirent.size, client)
+            for dirent in dirents]
+
+def _iter_upload_batches(files, batch_count, batch_bytes):
+    """Group `(filename, fileobj)` pairs into lists of at most `batch_count`
+    files and `batch_bytes` bytes"""
+    batch, batch_size = [], 0
+    for filename, fileobj in files:
+        size = content_size(fileobj)
+        if size is None:
+            size = batch_bytes
+        if batch and (len(batch) >= batch_count or batch_size + size > batch_bytes):
+            yield batch
+            batch, batch_size = [], 0
+        batch.append((filename, fileobj))
+        batch_size += size
+    if batch:
+        yield batch
+
+def _get_fileserver_link(client, op, repo_id):
+    """Return a fileserver link to `op` ('upload' or 'update') files in repo
+    `repo_id`, reusing the one cached in `client.upload_links` while it is
+    valid.
+
+    Return a `(link, cached)` tuple.
+    """
+    key = (op, repo_id)
+    link = client.upload_links.get(key)
+    if link is not None:
+        return link, True
+    resp = client.get('/api2/repos/%s/%s-link/' % (repo_id, op))
+    link = re.match(r'"(.*)"', resp.text).group(1)
+    client.upload_links.set(key, link)
+    return link, False
+
+def _get_fileserver_root(client, repo_id):
+    """Return the root url of the fileserver, as seen in the upload link of
+    repo `repo_id`, or the default one if the repo is read only.
+
+    The root is kept in `client.upload_links` along with the links, so that
+    it is only looked up once per repo while it is valid.
+    """
+    key = ('fileserver-root', repo_id)
+    root = client.upload_links.get(key)
+    if root is not None:
+        return root
+    try:
+        link, _ = _get_fileserver_link(client, 'upload', repo_id)
+    except ClientHttpError:
+        root = client.server.rstrip('/') + '/seafhttp'
+    else:
+        root = link.rsplit('/upload-api/', 1)[0]
+    client.upload_links.set(key, root)
+    return root
+
+def _wait_for_zip_task(client, token, timeout=None):
+    """Wait for the zip task `token` to complete, polling its progress less
+    and less often.
+
+    Raises :exc:`OperationError` if the task fails, is canceled, or doesn't
+    complete within `timeout` seconds.
+    """
+    url = '/api/v2.1/query-zip-progress/' + querystr(token=token)
+    deadline = None if timeout is None else time.time() + timeout
+    interval = TASK_POLL_INTERVAL
+    while True:
+        progress = client.get(url).json()
+        if progress.get('failed') or progress.get('canceled'):
+            raise OperationError('Zip task %s failed: %s' % (
+                token, progress.get('failed_reason') or 'canceled'))
+        total = progress.get('total')
+        if not isinstance(total, int):
+            raise OperationError('Unexpected progress of zip task %s: %r' % (token, progress))
+        if progress.get('zipped') == total:
+            return progress
+        if deadline is not None and time.time() + interval > deadline:
+            raise OperationError('Zip task %s did not complete in %s seconds' % (token, timeout))
+        time.sleep(interval)
+        interval = min(interval * 2, TASK_POLL_MAX_INTERVAL)
+
+def _post_to_fileserver(client, op, repo_id, encoder, query='', headers=None):
+    """Post the multipart body `encoder` to an `op` link of repo `repo_id`.
+
+    If the fileserver rejects a cached link because its token has expired,
+    the link is refreshed and the body sent again.
+    """
+    headers = dict(headers or {})
+    headers['Content-Type'] = encoder.content_type
+    link, cached = _get_fileserver_link(client, op, repo_id)
+    try:
+        return client.post(link + query, data=encoder, headers=headers)
+    except ClientHttpError as e:
+        if not cached or e.code not in STALE_LINK_CODES:
+            raise
+        client.upload_links.invalidate((op, repo_id), link)
+        try:
+            encoder.rewind()
+        except io.UnsupportedOperation:
+            raise e
+    link, _ = _get_fileserver_link(client, op, repo_id)
+    return client.post(link + query, data=encoder, headers=headers)
 
 class _SeafDirentBase(object):
     """Base class for :class:`SeafFile` and :class:`SeafDir`.
 
     It provides implementation of their common operations.
+
+    Dirents use `__slots__` and store their parent path and name separately,
+    the parent path being interned, so that the entries of a folder share a
+    single copy of it. Large listings thus take much less memory.
     """
+    __slots__ = ('client', 'repo_id', '_parent', '_name', 'id', 'size')
     isdir = None
 
     def __init__(self, repo_id, path, object_id, size=0, client=None):
@@ -32,9 +364,23 @@ class _SeafDirentBase(object):
                                           self.repo_id[:6],
                                           self.path)
 
+    @property
+    def path(self):
+        if self._name is None:
+            return None
+        return posixpath.join(self._parent, self._name)
+
+    @path.setter
+    def path(self, path):
+        if path is None:
+            self._parent = self._name = None
+            return
+        parent, self._name = posixpath.split(path)
+        self._parent = sys.intern(parent)
+
     @property
     def name(self):
-        return posixpath.basename(self.path)
+        return self._name
 
     def get_path(self):
         return self.path
@@ -42,15 +388,21 @@ class _SeafDirentBase(object):
     def get_repo_id(self):
         return self.repo_id
 
-    # @property
-    # def path(self):
-    #     return self.path
-    #
-    # @property
-    # def repo_id(self):
-    #     return self.repo_id
-
+    def _copy_from(self, other):
+        """Make this object describe the same dirent as `other`"""
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                setattr(self, slot, getattr(other, slot))
 
+    def _load_at(self, path):
+        """Return an object of the same type as this one for the dirent
+        `path` of its repo"""
+        if self.isdir:
+            oid, _ = _list_dir(self.client, self.repo_id, path)
+            return SeafDir(self.repo_id, path, oid, 0, self.client)
+        url = '/api2/repos/%s/file/detail/' % self.repo_id + querystr(p=path)
+        file_json = self.client.get(url).json()
+        return SeafFile(self.repo_id, path, file_json['id'], file_json['size'], self.client)
 
     def list_revisions(self):
         pass
@@ -65,24 +417,19 @@ class _SeafDirentBase(object):
         """Change file/folder name to newname
         """
         suffix = 'dir' if self.isdir else 'file'
-        url = '/api2/repos/%s/%s/' % (self.repo.id, suffix) + querystr(p=self.path, reloaddir='true')
+        url = '/api2/repos/%s/%s/' % (self.repo_id, suffix) + querystr(p=self.path, reloaddir='true')
         postdata = {'operation': 'rename', 'newname': newname}
         resp = self.client.post(url, data=postdata)
         succeeded = resp.status_code == 200
         if succeeded:
-            if self.isdir:
-                new_dirent = self.repo.get_dir(os.path.join(os.path.dirname(self.path), newname))
-            else:
-                new_dirent = self.repo.get_file(os.path.join(os.path.dirname(self.path), newname))
-            for key in list(self.__dict__.keys()):
-                self.__dict__[key] = new_dirent.__dict__[key]
+            self._copy_from(self._load_at(posixpath.join(self._parent, newname)))
         return succeeded
 
     def _copy_move_task(self, operation, dirent_type, dst_dir, dst_repo_id=None):
         url = '/api/v2.1/copy-move-task/'
-        src_repo_id = self.repo.id
-        src_parent_dir = os.path.dirname(self.path)
-        src_dirent_name = os.path.basename(self.path)
+        src_repo_id = self.repo_id
+        src_parent_dir = self._parent
+        src_dirent_name = self.name
         dst_repo_id = dst_repo_id
         dst_parent_dir = dst_dir
         operation = operation
@@ -91,13 +438,18 @@ class _SeafDirentBase(object):
                     'src_dirent_name': src_dirent_name, 'dst_repo_id': dst_repo_id,
                     'dst_parent_dir': dst_parent_dir, 'operation': operation,
                     'dirent_type': dirent_type}
-        return self.client.post(url, data=postdata)
+        resp = self.client.post(url, data=postdata)
+        # Copies and moves across repos are run as background tasks
+        task_id = resp.json().get('task_id')
+        if task_id:
+            _wait_for_task(self.client, task_id)
+        return resp
 
     def copyTo(self, dst_dir, dst_repo_id=None):
         """Copy file/folder to other directory (also to a different repo)
         """
         if dst_repo_id is None:
-            dst_repo_id = self.repo.id
+            dst_repo_id = self.repo_id
 
         dirent_type = 'dir' if self.isdir else 'file'
         resp = self._copy_move_task('copy', dirent_type, dst_dir, dst_repo_id)
@@ -105,34 +457,40 @@ class _SeafDirentBase(object):
 
     def moveTo(self, dst_dir, dst_repo_id=None):
         """Move file/folder to other directory (also to a different repo)
+
+        This object is updated to point to the new location.
         """
         if dst_repo_id is None:
-            dst_repo_id = self.repo.id
+            dst_repo_id = self.repo_id
 
         dirent_type = 'dir' if self.isdir else 'file'
         resp = self._copy_move_task('move', dirent_type, dst_dir, dst_repo_id)
         succeeded = resp.status_code == 200
         if succeeded:
-            new_repo = self.client.repos.get_repo(dst_repo_id)
-            dst_path = os.path.join(dst_dir, os.path.basename(self.path))
-            if self.isdir:
-                new_dirent = new_repo.get_dir(dst_path)
-            else:
-                new_dirent = new_repo.get_file(dst_path)
-            for key in list(self.__dict__.keys()):
-                self.__dict__[key] = new_dirent.__dict__[key]
+            self._moved_to(dst_repo_id, dst_dir)
         return succeeded
 
+    def _moved_to(self, repo_id, parent_dir):
+        """Update this object once the dirent was moved into the folder
+        `parent_dir` of repo `repo_id`. A move keeps the object id."""
+        self.repo_id = repo_id
+        self.path = posixpath.join(parent_dir, self.name)
+
     def get_share_link(self):
         pass
 
 class SeafDir(_SeafDirentBase):
+    __slots__ = ('entries', )
     isdir = True
 
     def __init__(self, *args, **kwargs):
+        entries = kwargs.pop('entries', None)
         super(SeafDir, self).__init__(*args, **kwargs)
+        self.entries = entries
+
+    def _moved_to(self, repo_id, parent_dir):
+        super(SeafDir, self)._moved_to(repo_id, parent_dir)
         self.entries = None
-        self.entries = kwargs.pop('entries', None)
 
     def ls(self, force_refresh=False):
         """List the entries in this dir.
@@ -145,7 +503,7 @@ class SeafDir(_SeafDirentBase):
         return self.entries
 
     def share_to_user(self, email, permission):
-        url = '/api2/repos/%s/dir/shared_items/' % self.repo.id + querystr(p=self.path)
+        url = '/api2/repos/%s/dir/shared_items/' % self.repo_id + querystr(p=self.path)
         putdata = {
             'share_type': 'user',
             'username': email,
@@ -154,6 +512,35 @@ class SeafDir(_SeafDirentBase):
         resp = self.client.put(url, data=putdata)
         return resp.status_code == 200
 
+    def delete_many(self, names, batch_size=DELETE_BATCH_SIZE,
+                    workers=DEFAULT_TRANSFER_WORKERS):
+        """Delete many files and folders of this folder.
+
+        :param:names The names of the dirents, or their :class:`SeafFile`
+        and :class:`SeafDir` objects
+        :param:batch_size The max number of dirents deleted by one request
+        :param:workers How many requests are sent concurrently
+
+        A batch that fails doesn't stop the others.
+
+        Return a list of :class:`seafileapi.transfer.BatchResult`, one per
+        batch.
+        """
+        names = [getattr(name, 'name', name) for name in names]
+        batches = [names[start:start + batch_size]
+                   for start in range(0, len(names), batch_size)]
+
+        def delete(batch):
+            data = {'repo_id': self.repo_id, 'parent_dir': self.path, 'dirents': batch}
+            self.client.delete('/api/v2.1/repos/batch-delete-item/', json=data)
+
+        results = run_batches(delete, batches, workers)
+        if self.entries is not None:
+            deleted = set(name for result in results if result.succeeded
+                          for name in result.names)
+            self.entries = [dirent for dirent in self.entries if dirent.name not in deleted]
+        return results
+
     def create_empty_file(self, name):
         """Create a new empty file in this dir.
         Return a :class:`SeafFile` object of the newly created file.
@@ -164,6 +551,7 @@ class SeafDir(_SeafDirentBase):
         postdata = {'operation': 'create'}
         resp = self.client.post(url, data=postdata)
         self.id = resp.headers['oid']
+        self.client.listings.set((self.repo_id, self.path), self.id, resp.content)
         self.load_entries(resp.json())
         return SeafFile(self.repo_id, path, ZERO_OBJ_ID, 0,self.client)
 
@@ -177,29 +565,57 @@ class SeafDir(_SeafDirentBase):
         postdata = {'operation': 'mkdir'}
         resp = self.client.post(url, data=postdata)
         self.id = resp.headers['oid']
+        self.client.listings.set((self.repo_id, self.path), self.id, resp.content)
         self.load_entries(resp.json())
         return SeafDir(self.repo_id, path, ZERO_OBJ_ID,0,self.client)
 
-    def upload(self, fileobj, filename):
+    def upload(self, fileobj, filename, replace=False):
         """Upload a file to this folder.
 
-        :param:fileobj :class:`File` like object
+        :param:fileobj :class:`File` like object, `str` or `bytes`
         :param:filename The name of the file
+        :param:replace Whether to overwrite an existing file of the same
+        name, instead of storing the new one under another name
+
+        The request body is streamed from `fileobj`, see
+        :class:`seafileapi.multipart.MultipartEncoder`.
 
         Return a :class:`SeafFile` object of the newly uploaded file.
         """
-        if isinstance(fileobj, str):
-            fileobj = io.BytesIO(fileobj.encode())
-        upload_url = self._get_upload_link()
-        files = {
-            'file': (filename, fileobj),
-            'parent_dir': self.path,
-        }
-        self.client.post(upload_url, files=files)
+        return self._upload_batch([(filename, fileobj)], replace)[0]
+
+    def upload_many(self, files, batch_count=UPLOAD_BATCH_COUNT,
+                    batch_bytes=UPLOAD_BATCH_BYTES, replace=False):
+        """Upload many files to this folder, sending several of them in each
+        request.
 
-        # repo_obj = Repo.create_from_repo_id(self.client, self.repo_id)
-        return self.get_file(posixpath.join(self.path, filename))
+        :param:files An iterable of `(filename, fileobj)` pairs, where
+        `fileobj` is anything :meth:`upload` accepts
+        :param:batch_count The max number of files sent in one request
+        :param:batch_bytes The max total size of the files sent in one
+        request. A larger file, or one whose size can't be known, is sent
+        alone.
+        :param:replace Whether to overwrite existing files, see :meth:`upload`
 
+        Return a list of :class:`SeafFile` objects of the newly uploaded
+        files, in the order of `files`.
+        """
+        uploaded = []
+        for batch in _iter_upload_batches(files, batch_count, batch_bytes):
+            uploaded.extend(self._upload_batch(batch, replace))
+        return uploaded
+
+    def _upload_batch(self, batch, replace=False):
+        fields = [('parent_dir', self.path)]
+        if replace:
+            fields.append(('replace', '1'))
+        fields.extend(('file', (filename, fileobj)) for filename, fileobj in batch)
+        encoder = MultipartEncoder(fields)
+        resp = _post_to_fileserver(self.client, 'upload', self.repo_id, encoder,
+                                   query='?ret-json=1')
+        return [SeafFile(self.repo_id, posixpath.join(self.path, file_json['name']),
+                         file_json['id'], file_json['size'], self.client)
+                for file_json in resp.json()]
 
     @raise_does_not_exist('The requested file does not exist')
     def get_file(self, path):
@@ -208,28 +624,401 @@ class SeafDir(_SeafDirentBase):
         """
         assert path.startswith('/')
         url = '/api2/repos/%s/file/detail/' % self.repo_id
-        query = querystr(dict(p=path))
+        query = querystr(p=path)
         file_json = self.client.get(url + query).json()
 
         return SeafFile(self.repo_id, path, file_json['id'], file_json['size'],self.client)
 
 
-    def upload_local_file(self, filepath, name=None):
+    def upload_local_file(self, filepath, name=None, replace=False):
         """Upload a file to this folder.
 
         :param:filepath The path to the local file
         :param:name The name of this new file. If None, the name of the local file would be used.
+        :param:replace Whether to overwrite an existing file, see :meth:`upload`
+
+        Return a :class:`SeafFile` object of the newly uploaded file.
+        """
+        name = name or os.path.basename(filepath)
+        with open(filepath, 'rb', buffering=UPLOAD_CHUNK_SIZE) as fp:
+            return self.upload(fp, name, replace)
+
+    def upload_tree(self, local_root, workers=DEFAULT_TRANSFER_WORKERS,
+                    replace=False, callback=None):
+        """Upload the content of the local directory `local_root` into this
+        folder, keeping its hierarchy.
+
+        :param:local_root The path to the local directory
+        :param:workers How many files are uploaded concurrently. The client
+        should be created with a `fileserver_pool_maxsize` at least as large.
+        :param:replace Whether to overwrite existing files, see :meth:`upload`
+        :param:callback Called with the :class:`seafileapi.transfer.TransferResult`
+        of each file once it is uploaded
+
+        Only the deepest folders are created explicitly, along with all their
+        parents, so the remote hierarchy takes one request per leaf folder.
+        A file that fails to upload doesn't stop the others.
+
+        Return a :class:`seafileapi.transfer.TransferReport`.
+        """
+        leaf_dirs, jobs = [], []
+        for dirpath, dirnames, filenames in os.walk(local_root):
+            relpath = os.path.relpath(dirpath, local_root)
+            remote_dir = self.path
+            if relpath != os.curdir:
+                remote_dir = posixpath.join(self.path, *relpath.split(os.sep))
+                if not dirnames:
+                    leaf_dirs.append(remote_dir)
+            for filename in filenames:
+                jobs.append((os.path.join(dirpath, filename),
+                             posixpath.join(remote_dir, filename)))
+
+        for remote_dir in leaf_dirs:
+            self._makedirs(remote_dir)
+
+        def upload(local_path, remote_path):
+            seafdir = SeafDir(self.repo_id, posixpath.dirname(remote_path),
+                              ZERO_OBJ_ID, 0, self.client)
+            return seafdir.upload_local_file(local_path, replace=replace).size
+
+        return run_transfers(upload, jobs, workers, callback)
+
+    def download_tree(self, local_root, workers=DEFAULT_TRANSFER_WORKERS,
+                      manifest_path=None, callback=None):
+        """Download the content of this folder into the local directory
+        `local_root`, keeping its hierarchy.
+
+        :param:local_root The path to the local directory, created if needed
+        :param:workers How many files are downloaded concurrently. The client
+        should be created with a `fileserver_pool_maxsize` at least as large.
+        :param:manifest_path Where to record the object id of each
+        downloaded file. Defaults to a `.seafile-manifest.json` file in
+        `local_root`.
+        :param:callback Called with the :class:`seafileapi.transfer.TransferResult`
+        of each file once it is done
+
+        Files whose object id is the one recorded in the manifest by a
+        previous call are skipped, as their content didn't change. Local
+        files that were removed from the folder are left alone.
+
+        Return a :class:`seafileapi.transfer.TransferReport`.
+        """
+        manifest_path = manifest_path or os.path.join(local_root, DOWNLOAD_MANIFEST_NAME)
+        manifest = _load_manifest(manifest_path)
+        manifest_lock = threading.Lock()
+
+        files, jobs = {}, []
+        for dirent in self._iter_tree():
+            relpath = posixpath.relpath(dirent.path, self.path)
+            local_path = os.path.join(local_root, *relpath.split('/'))
+            if dirent.isdir:
+                if not os.path.isdir(local_path):
+                    os.makedirs(local_path)
+            else:
+                files[dirent.path] = (dirent, relpath)
+                jobs.append((local_path, dirent.path))
+
+        def download(local_path, remote_path):
+            seaffile, relpath = files[remote_path]
+            if manifest.get(relpath) == seaffile.id and os.path.exists(local_path):
+                return None
+            local_dir = os.path.dirname(local_path)
+            if not os.path.isdir(local_dir):
+                os.makedirs(local_dir)
+            if seaffile.id == ZERO_OBJ_ID:
+                open(local_path, 'wb').close()
+            else:
+                seaffile.download_to(local_path, hash_name=None)
+            with manifest_lock:
+                manifest[relpath] = seaffile.id
+            return seaffile.size
+
+        if not os.path.isdir(local_root):
+            os.makedirs(local_root)
+        try:
+            return run_transfers(download, jobs, workers, callback)
+        finally:
+            _write_json(manifest_path, manifest)
+
+    def download_zip(self, dest, names=None, extract=False, timeout=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE):
+        """Download this folder, or its dirents `names`, as a zip archive
+        that the server builds.
+
+        The server is asked to zip the dirents, its progress is polled less
+        and less often until the archive is ready, then the archive is
+        streamed from the fileserver.
+
+        :param:dest A local path or a writable file-like object to write the
+        archive to, or the local directory to extract it into if `extract`
+        is set
+        :param:names The names of the dirents of this folder to zip. By
+        default the folder itself is, as a top level folder of the archive,
+        or its content for the root folder of a repo.
+        :param:extract Extract the archive into `dest` as it is downloaded,
+        without storing it, see :func:`seafileapi.zipstream.extract_stream`
+        :param:timeout How many seconds to wait for the archive to be ready
+
+        Raises :exc:`OperationError` if the zip task fails or times out.
+
+        Return the names of the members extracted if `extract` is set, the
+        size of the archive otherwise.
+        """
+        if names is not None:
+            parent_dir, names = self.path, list(names)
+        elif self.path == '/':
+            parent_dir, names = '/', [dirent.name for dirent in self.ls(force_refresh=True)]
+        else:
+            parent_dir, names = posixpath.split(self.path.rstrip('/'))
+            names = [names]
+        query = urlencode([('parent_dir', parent_dir)] + [('dirents', name) for name in names])
+        url = '/api/v2.1/repos/%s/zip-task/?%s' % (self.repo_id, query)
+        token = self.client.get(url).json()['zip_token']
+        _wait_for_zip_task(self.client, token, timeout)
+
+        url = '%s/zip/%s' % (_get_fileserver_root(self.client, self.repo_id), token)
+        with DownloadStream(self.client.get(url, stream=True), hash_name=None) as stream:
+            if extract:
+                return extract_stream(stream, dest, chunk_size)
+            if hasattr(dest, 'write'):
+                return _copy_stream(stream, dest, chunk_size)
+            tmp_path = dest + '.part'
+            try:
+                with open(tmp_path, 'wb') as fp:
+                    size = _copy_stream(stream, fp, chunk_size)
+                os.replace(tmp_path, dest)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            return size
+
+    def _iter_tree(self):
+        """Yield every file and folder below this folder"""
+        for _, dirs, files in self.walk():
+            for dirent in dirs + files:
+                yield dirent
+
+    def walk(self, dirs_only=False):
+        """Walk the tree below this folder like :func:`os.walk` does, top
+        down.
+
+        Yield a `(dirpath, dirs, files)` tuple for this folder and each
+        folder below it, where `dirs` and `files` are lists of
+        :class:`SeafDir` and :class:`SeafFile` objects. Like with
+        :func:`os.walk`, removing items from `dirs` prunes the walk.
+
+        :param:dirs_only Only list folders, `files` is always empty
+
+        The whole tree is listed in a single request with the recursive
+        mode of the dir api. As the server lists it depth first, the raw
+        listing is buffered before the first folder is yielded, and the
+        objects are only created for the folder being yielded. Servers which
+        don't support it are walked one folder at a time.
+        """
+        children = self._load_tree(dirs_only)
+        if children is None:
+            for item in self._walk_levels(dirs_only):
+                yield item
+            return
+
+        pending = [self.path.rstrip('/') or '/']
+        while pending:
+            dirpath = pending.pop()
+            dirs, files = [], []
+            for dirent_json in children.pop(dirpath, ()):
+                dirent = self._load_dirent(dirent_json, dirpath)
+                (dirs if dirent.isdir else files).append(dirent)
+            yield dirpath, dirs, files
+            pending.extend(seafdir.path for seafdir in reversed(dirs))
+
+    def load_tree(self, table=None, dirs_only=False):
+        """List every file and folder below this folder into a
+        :class:`DirentTable`.
+
+        :param:table The table to append the dirents to. A new one is
+        created if None.
+        :param:dirs_only Only list folders
+
+        Like :meth:`walk`, the whole tree is listed in a single request when
+        the server supports it.
+
+        Return the table.
+        """
+        if table is None:
+            table = DirentTable(self.repo_id, self.client)
+        dirent_list = self._get_recursive_listing(dirs_only)
+        if dirent_list is None:
+            for dirpath, dirs, files in self._walk_levels(dirs_only):
+                for dirent in dirs + files:
+                    table.append(dirpath, dirent.name, dirent.isdir, dirent.id, dirent.size)
+        else:
+            for dirent_json in dirent_list:
+                table.append_json(dirent_json, _parent_dir(dirent_json))
+        return table
+
+    def _get_recursive_listing(self, dirs_only):
+        """List the whole tree below this folder in one request.
+
+        The listing is parsed as it is received. Return an iterator over the
+        dirents json, each with its `parent_dir`, or None if the server
+        doesn't support the recursive mode.
+        """
+        params = {'p': self.path, 'recursive': 1}
+        if dirs_only:
+            params['t'] = 'd'
+        url = '/api/v2.1/repos/%s/dir/' % self.repo_id + querystr(**params)
+        try:
+            resp = self.client.get(url, stream=True)
+        except ClientHttpError as e:
+            if e.code not in RECURSIVE_LISTING_UNSUPPORTED_CODES:
+                raise
+            return None
+
+        dirent_list = _iter_json_response(resp, resp.iter_content(LISTING_CHUNK_SIZE),
+                                          'dirent_list')
+        try:
+            first = next(dirent_list, None)
+        except (KeyError, ValueError):
+            return None
+        if first is None:
+            return iter(())
+        if first.get('parent_dir') is None:
+            dirent_list.close()
+            return None
+        return itertools.chain([first], dirent_list)
+
+    def _load_tree(self, dirs_only):
+        """List the whole tree below this folder in one request.
+
+        Return a dict mapping the path of each folder to the list of the
+        dirents json of its entries, or None if the server doesn't support
+        the recursive mode.
+        """
+        dirent_list = self._get_recursive_listing(dirs_only)
+        if dirent_list is None:
+            return None
+
+        children = {}
+        for dirent_json in dirent_list:
+            if dirs_only and dirent_json['type'] != 'dir':
+                continue
+            children.setdefault(_parent_dir(dirent_json), []).append(dirent_json)
+        return children
+
+    def _walk_levels(self, dirs_only):
+        """Walk the tree like :meth:`walk`, listing one folder at a time,
+        without touching the entries loaded in the folder objects"""
+        pending = [self.path]
+        while pending:
+            path = pending.pop()
+            _, dirents_json = _list_dir(self.client, self.repo_id, path)
+            entries = [self._load_dirent(dirent_json, path) for dirent_json in dirents_json]
+            dirs = [dirent for dirent in entries if dirent.isdir]
+            files = [] if dirs_only else [dirent for dirent in entries if not dirent.isdir]
+            yield path, dirs, files
+            pending.extend(seafdir.path for seafdir in reversed(dirs))
+
+    def _makedirs(self, path):
+        """Create the folder `path` of this repo along with its missing
+        parents"""
+        url = '/api2/repos/%s/dir/' % self.repo_id + querystr(p=path)
+        postdata = {'operation': 'mkdir', 'create_parents': 'true'}
+        self.client.post(url, data=postdata)
+
+    def upload_large(self, filepath, name=None, chunk_size=RESUMABLE_CHUNK_SIZE,
+                     state_path=None, max_retries=5):
+        """Upload a large local file to this folder in chunks, resuming after
+        failures.
+
+        :param:filepath The path to the local file
+        :param:name The name of this new file. If None, the name of the local file would be used.
+        :param:chunk_size The size of each chunk sent to the server
+        :param:state_path Where to keep the resume state. Defaults to
+        `filepath` + '.seafupload'
+        :param:max_retries How many times in a row a chunk may fail before giving up
+
+        The offset of the last chunk acknowledged by the server is recorded
+        in `state_path`, so that calling this method again for the same file
+        continues where the previous call stopped. The state file is removed
+        once the upload completes.
 
         Return a :class:`SeafFile` object of the newly uploaded file.
         """
         name = name or os.path.basename(filepath)
-        with open(filepath, 'r') as fp:
-            return self.upload(fp, name)
+        state_path = state_path or filepath + '.seafupload'
+        st = os.stat(filepath)
+        if st.st_size == 0:
+            return self.upload_local_file(filepath, name)
+
+        state = {
+            'repo_id': self.repo_id,
+            'parent_dir': self.path,
+            'name': name,
+            'size': st.st_size,
+            'mtime': st.st_mtime,
+        }
+        offset = 0
+        if _load_upload_state(state_path, state) is not None:
+            offset = self._get_uploaded_bytes(name)
+
+        failures = 0
+        with open(filepath, 'rb') as fp:
+            while True:
+                upload_url = None
+                try:
+                    upload_url = self._get_upload_link()
+                    fp.seek(offset)
+                    resp = self._upload_chunk(upload_url + '?ret-json=1', name,
+                                              fp.read(chunk_size), offset, st.st_size)
+                except (ClientHttpError, RequestException):
+                    failures += 1
+                    if failures > max_retries:
+                        raise
+                    time.sleep(min(2 ** failures, 60))
+                    if upload_url is not None:
+                        self.client.upload_links.invalidate(('upload', self.repo_id),
+                                                            upload_url)
+                    offset = self._get_uploaded_bytes(name, offset)
+                    continue
+
+                failures = 0
+                offset = min(offset + chunk_size, st.st_size)
+                if offset >= st.st_size:
+                    break
+                state['offset'] = offset
+                _write_json(state_path, state)
+
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        file_json = resp.json()[0]
+        return SeafFile(self.repo_id, posixpath.join(self.path, file_json['name']),
+                        file_json['id'], file_json['size'], self.client)
+
+    def _upload_chunk(self, upload_url, name, chunk, offset, total):
+        encoder = MultipartEncoder([
+            ('parent_dir', self.path),
+            ('file', (name, chunk)),
+        ])
+        headers = {
+            'Content-Type': encoder.content_type,
+            'Content-Range': 'bytes %d-%d/%d' % (offset, offset + len(chunk) - 1, total),
+            'Content-Disposition': 'attachment; filename="%s"' % quote(name),
+        }
+        return self.client.post(upload_url, data=encoder, headers=headers)
+
+    def _get_uploaded_bytes(self, name, default=0):
+        """Ask the server how many bytes of a chunked upload of file `name`
+        in this folder it has received so far"""
+        url = '/api/v2.1/repos/%s/file-uploaded-bytes/' % self.repo_id + \
+            querystr(parent_dir=self.path, file_name=name)
+        try:
+            return int(self.client.get(url).json()['uploadedBytes'])
+        except (ClientHttpError, RequestException, KeyError, ValueError):
+            return default
 
     def _get_upload_link(self):
-        url = '/api2/repos/%s/upload-link/' % self.repo_id
-        resp = self.client.get(url)
-        return re.match(r'"(.*)"', resp.text).group(1)
+        return _get_fileserver_link(self.client, 'upload', self.repo_id)[0]
 
     def get_uploadable_sharelink(self):
         """Generate a uploadable shared link to this dir.
@@ -238,15 +1027,37 @@ class SeafDir(_SeafDirentBase):
         """
         pass
 
-    def load_entries(self, dirents_json=None):
+    def iter_entries(self):
+        """Iterate over the entries of this folder as the listing is
+        received, without holding it in memory as a whole.
+
+        Unlike with :meth:`ls`, the entries are not kept in :attr:`entries`,
+        which suits folders with hundreds of thousands of entries.
+
+        Yield :class:`SeafFile` and :class:`SeafDir` objects.
+        """
+        self.id, dirents_json = _iter_dir(self.client, self.repo_id, self.path)
+        for dirent_json in dirents_json:
+            yield self._load_dirent(dirent_json)
+
+    def load_entries(self, dirents_json=None, table=None):
+        """Load the entries of this folder, listing it if `dirents_json`
+        is None.
+
+        If a :class:`DirentTable` is given as `table`, the entries are
+        appended to it instead of being stored in :attr:`entries`.
+        """
         if dirents_json is None:
-            url = '/api2/repos/%s/dir/' % self.repo_id + querystr(p=self.path)
-            dirents_json = self.client.get(url).json()
+            self.id, dirents_json = _list_dir(self.client, self.repo_id, self.path)
 
+        if table is not None:
+            for entry_json in dirents_json:
+                table.append_json(entry_json, self.path)
+            return
         self.entries = [self._load_dirent(entry_json) for entry_json in dirents_json]
 
-    def _load_dirent(self, dirent_json):
-        path = posixpath.join(self.path, dirent_json['name'])
+    def _load_dirent(self, dirent_json, parent_dir=None):
+        path = posixpath.join(parent_dir or self.path, dirent_json['name'])
         if dirent_json['type'] == 'file':
             return SeafFile(self.repo_id, path, dirent_json['id'], dirent_json['size'],self.client)
         else:
@@ -279,24 +1090,416 @@ class SeafDir(_SeafDirentBase):
 
 
 class SeafFile(_SeafDirentBase):
+    __slots__ = ()
     isdir = False
 
     def update(self, fileobj):
-        """Update the content of this file"""
-        pass
+        """Update the content of this file
+
+        :param:fileobj :class:`File` like object, `str` or `bytes`
+        """
+        encoder = MultipartEncoder([
+            ('target_file', self.path),
+            ('file', (self.name, fileobj)),
+        ])
+        _post_to_fileserver(self.client, 'update', self.repo_id, encoder)
+
+        url = '/api2/repos/%s/file/detail/' % self.repo_id + querystr(p=self.path)
+        file_json = self.client.get(url).json()
+        self.id = file_json['id']
+        self.size = file_json['size']
 
     def __str__(self):
         return 'SeafFile[repo=%s,path=%s,size=%s]' % \
             (self.repo_id[:6], self.path, self.size)
 
-    def _get_download_link(self):
-        url = '/api2/repos/%s/file/' % self.repo_id + querystr(p=self.path)
+    def _get_download_link(self, reuse=False):
+        """Return a download link of the file, reusing the one cached in
+        `client.download_links` for its object id while it is valid.
+
+        The link is asked for by path, so it gives access to the current
+        version of the file, which differs from `self.id` if the file changed
+        since this object was loaded. The server tells which version in the
+        `oid` header, and the link is only cached under that id.
+
+        :param:reuse Ask for a link which can be used more than once even if
+        links aren't cached
+
+        Return a `(link, oid, cached)` tuple, where `oid` is the object id of
+        the content the link gives access to, or None if it isn't known.
+        """
+        params = {'p': self.path}
+        cache = self.id != ZERO_OBJ_ID and self.client.download_links.ttl > 0
+        if cache:
+            link = self.client.download_links.get(('download', self.repo_id, self.id))
+            if link is not None:
+                return link, self.id, True
+        if cache or reuse:
+            # A link which can be used more than once
+            params['reuse'] = 1
+        url = '/api2/repos/%s/file/' % self.repo_id + querystr(**params)
         resp = self.client.get(url)
-        return re.match(r'"(.*)"', resp.text).group(1)
+        link = resp.json()
+        oid = resp.headers.get('oid')
+        if cache and oid is not None:
+            self.client.download_links.set(('download', self.repo_id, oid), link)
+        return link, oid, False
+
+    def _get_from_fileserver(self, link=None, **kwargs):
+        """Get the content of the file from the fileserver.
+
+        :param:link A `(link, oid, cached)` tuple returned by
+        :meth:`_get_download_link` to go through, so that several requests
+        get the same version of the file, by default a new or cached link
+
+        If the fileserver rejects a cached link because its token expired,
+        the link is refreshed and the request sent again. When `link` was
+        given, the new link must give access to the same version, or else
+        :exc:`seafileapi.exceptions.OperationError` is raised.
+
+        Return a `(response, oid)` tuple, where `oid` is the object id of the
+        content, or None if it isn't known.
+        """
+        pinned = link is not None
+        if not pinned:
+            link = self._get_download_link()
+        url, oid, cached = link
+        try:
+            return self.client.get(url, **kwargs), oid
+        except ClientHttpError as e:
+            if not cached or e.code not in STALE_DOWNLOAD_LINK_CODES:
+                raise
+            self.client.download_links.invalidate(('download', self.repo_id, oid), url)
+        url, new_oid, _ = self._get_download_link(reuse=pinned)
+        if pinned and new_oid != oid:
+            raise OperationError('%s changed while it was read' % self.path)
+        return self.client.get(url, **kwargs), new_oid
+
+    def _content_cache(self):
+        """Return the content cache of the client, unless the id of this
+        file isn't known"""
+        if self.id == ZERO_OBJ_ID:
+            return None
+        return self.client.content_cache
 
     def get_content(self):
-        """Get the content of the file"""
-        url = self._get_download_link()
-        return self.client.get(url).content
+        """Get the content of the file.
+
+        If the client has a content cache, the content is read from it when
+        it holds the id of this file, and added to it otherwise, under the id
+        of the version the server returned.
+        """
+        cache = self._content_cache()
+        if cache is not None:
+            content = cache.get(self.id)
+            if content is not None:
+                return content
+        resp, oid = self._get_from_fileserver()
+        content = resp.content
+        if cache is not None and oid is not None and \
+           (oid != self.id or len(content) == self.size):
+            try:
+                cache.set(oid, content)
+            except (IOError, OSError):
+                pass
+        return content
+
+    def open(self, mode='rb', hash_name=DEFAULT_HASH_NAME, block_size=DEFAULT_BLOCK_SIZE,
+             readahead=DEFAULT_READAHEAD, cache_blocks=DEFAULT_CACHE_BLOCKS):
+        """Open the content of the file for random access reads.
+
+        Return a readable and seekable
+        :class:`seafileapi.streams.RangeReader`, which fetches the parts of
+        the content being read with http Range requests, see it for
+        `block_size`, `readahead` and `cache_blocks`. It can be passed to
+        e.g. :class:`zipfile.ZipFile` to read a remote archive. As long as
+        the content is read from its start without gaps, its `checksum`
+        attribute is the `hash_name` checksum of the bytes read so far.
+
+        Like with :meth:`get_content`, the content cache of the client is
+        used when there is one: the content is then read from the local
+        disk, or added to the cache once it was read entirely.
+
+        Reads raise :exc:`seafileapi.exceptions.OperationError` if the file
+        changed since this object was loaded.
+        """
+        if mode != 'rb':
+            raise ValueError('invalid mode: %r, only "rb" is supported' % mode)
+        cache = self._content_cache()
+        fp = self._open_cached(cache)
+        if fp is not None:
+            return CachedStream(fp, hash_name)
+
+        def get_range(start, end):
+            data, oid = self._get_range(start, end)
+            if cache is not None and start == 0 and reader.bytes_read == 0 and oid == self.id:
+                # Only cache the content once the server confirmed its version
+                reader.set_cache_writer(self._cache_writer(cache, oid))
+            return data
+
+        reader = RangeReader(get_range, self.size, hash_name, block_size,
+                             readahead, cache_blocks)
+        return reader
+
+    def _get_range(self, start, end):
+        """Return the bytes from `start` to `end` (excluded) of the content,
+        or a :class:`seafileapi.streams.DownloadStream` of the whole content
+        if the server ignores the range, along with the object id of the
+        content"""
+        resp, oid = self._get_from_fileserver(headers={'Range': 'bytes=%d-%d' % (start, end - 1)},
+                                              expected=(200, 206), stream=True)
+        if oid is not None and self.id != ZERO_OBJ_ID and oid != self.id:
+            # The parts read so far belong to another version
+            resp.close()
+            raise OperationError('%s changed since it was loaded' % self.path)
+        if resp.status_code == 200:
+            return DownloadStream(resp, hash_name=None), oid
+        try:
+            return resp.content, oid
+        finally:
+            resp.close()
+
+    def _open_cached(self, cache):
+        """Return the cached content of the file as a file object, or None"""
+        if cache is None:
+            return None
+        return cache.open(self.id)
+
+    def _cache_writer(self, cache, oid):
+        """Return a writer to add the content of the version `oid` of the
+        file to `cache`, or None if that version isn't known"""
+        if cache is None or oid is None:
+            return None
+        try:
+            return cache.writer(oid, self.size if oid == self.id else None)
+        except (IOError, OSError):
+            return None
+
+    def _open_stream(self, hash_name=DEFAULT_HASH_NAME):
+        """Open the content of the file for reading it once from its start,
+        in a single request.
+
+        Return a readable :class:`seafileapi.streams.DownloadStream`, which
+        computes a `hash_name` checksum of the content as it is read.
+        """
+        cache = self._content_cache()
+        fp = self._open_cached(cache)
+        if fp is not None:
+            return CachedStream(fp, hash_name)
+        resp, oid = self._get_from_fileserver(stream=True)
+        return DownloadStream(resp, hash_name, self._cache_writer(cache, oid))
+
+    def iter_content(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Iterate over the content of the file in pieces of at most
+        `chunk_size` bytes, without holding the whole file in memory.
+        """
+        with self._open_stream(hash_name=None) as stream:
+            for chunk in stream.iter_chunks(chunk_size):
+                yield chunk
+
+    def download_to(self, dest, chunk_size=DEFAULT_CHUNK_SIZE, hash_name=DEFAULT_HASH_NAME,
+                    segments=1):
+        """Stream the content of the file to `dest`, which is either a local
+        path or a writable file-like object.
+
+        A local file is first written under a temporary name and only renamed
+        to `dest` once the download completes.
+
+        :param:segments Download a local file in up to that many byte ranges
+        at once, each over its own connection, which is faster when a single
+        connection is slower than the link. All the ranges go through the
+        same download link, so that they belong to the same version of the
+        file. The file is allocated upfront and each range is written in
+        place. A range which fails midway, or whose request gets a 5xx or 429
+        response, is resumed from where it stopped, up to `SEGMENT_ATTEMPTS`
+        times. The checksum is then computed by
+        reading the file back. Ranges are at least `MIN_SEGMENT_SIZE` bytes.
+        The file is downloaded in one go if it is read from the content
+        cache, if the server doesn't support ranges, or if the file changed
+        size since this object was loaded.
+
+        Return the `hash_name` hex digest of the downloaded content.
+        """
+        if hasattr(dest, 'write'):
+            return self._download_to_fileobj(dest, chunk_size, hash_name)
+
+        segments = min(segments, self.size // MIN_SEGMENT_SIZE)
+        cache = self._content_cache()
+        if not hasattr(os, 'pwrite') or (cache is not None and self.id in cache):
+            segments = 1
+        tmp_path = dest + '.part'
+        try:
+            if segments > 1 and self._download_segments(tmp_path, segments, chunk_size):
+                checksum = _file_checksum(tmp_path, hash_name, chunk_size)
+            else:
+                with open(tmp_path, 'wb') as fp:
+                    checksum = self._download_to_fileobj(fp, chunk_size, hash_name)
+            os.replace(tmp_path, dest)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return checksum
+
+    def _download_segments(self, path, segments, chunk_size):
+        """Download the content to the local file `path` in `segments` byte
+        ranges at once.
+
+        Return False, without creating the file, if the server doesn't
+        answer the first range with a partial content, or if the content
+        isn't `self.size` bytes long anymore.
+        """
+        step = -(-self.size // segments)
+        ranges = [(start, min(start + step, self.size))
+                  for start in range(0, self.size, step)]
+        link = self._get_download_link(reuse=True)
+        # The first range tells the size of the content the link gives
+        # access to
+        first, _ = self._get_from_fileserver(link, headers={'Range': 'bytes=0-%d' % (step - 1)},
+                                             expected=(200, 206), stream=True)
+        if first.status_code != 206 or _content_range_total(first) != self.size:
+            first.close()
+            return False
+
+        failed = threading.Event()
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o666)
+        except BaseException:
+            first.close()
+            raise
+        try:
+            # A sparse file that the segments fill in place
+            os.ftruncate(fd, self.size)
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [executor.submit(self._download_segment, fd, start, end, chunk_size,
+                                           failed, link, first if start == 0 else None)
+                           for start, end in ranges]
+                for future in futures:
+                    try:
+                        future.result()
+                    except BaseException:
+                        failed.set()
+                        raise
+        finally:
+            first.close()
+            os.close(fd)
+        return True
+
+    def _download_segment(self, fd, start, end, chunk_size, failed, link, resp=None):
+        """Write the bytes from `start` to `end` (excluded) of the content at
+        the same offsets of the file `fd`, through `link` and starting with
+        the response `resp` if given, resuming after failures"""
+        offset = start
+        attempt = 1
+        while offset < end and not failed.is_set():
+            try:
+                if resp is None:
+                    resp, _ = self._get_from_fileserver(
+                        link, headers={'Range': 'bytes=%d-%d' % (offset, end - 1)},
+                        expected=206, stream=True)
+                try:
+                    for chunk in resp.iter_content(chunk_size):
+                        if failed.is_set():
+                            return
+                        chunk = chunk[:end - offset]
+                        os.pwrite(fd, chunk, offset)
+                        offset += len(chunk)
+                finally:
+                    resp.close()
+                    resp = None
+                if offset < end:
+                    raise OperationError('Range %d-%d of %s stopped at %d' %
+                                         (start, end, self.path, offset))
+            except (RequestException, OperationError, ClientHttpError) as e:
+                if attempt >= SEGMENT_ATTEMPTS or (isinstance(e, ClientHttpError) and
+                                                   e.code != 429 and e.code < 500):
+                    raise
+                time.sleep(self.client.retry.get_delay(attempt))
+                attempt += 1
+
+    def _download_to_fileobj(self, fileobj, chunk_size, hash_name):
+        with self._open_stream(hash_name) as stream:
+            for chunk in stream.iter_chunks(chunk_size):
+                fileobj.write(chunk)
+            return stream.checksum
 
     __repr__ = __str__
+
+
+class DirentTable(object):
+    """A compact table of the dirents of a repo, for listings too large to
+    hold as :class:`SeafFile` and :class:`SeafDir` objects.
+
+    Names, sizes, object ids and mtimes are stored column by column in flat
+    arrays, and each parent path is stored once. Dirent objects are only
+    created when a row is accessed::
+
+        table = repo.load_tree('/')
+        print(len(table), table.total_size)
+        for dirent in table:
+            ...
+    """
+    def __init__(self, repo_id, client=None):
+        self.repo_id = repo_id
+        self.client = client
+        self.parents = []
+        self.names = []
+        self.sizes = array('q')
+        self.mtimes = array('q')
+        self._parent_index = {}
+        self._parent_ids = array('l')
+        self._isdir = bytearray()
+        self._ids = bytearray()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return '<{} repo={} rows={}>'.format(self.__class__.__name__,
+                                            self.repo_id[:6], len(self))
+
+    def append(self, parent_dir, name, isdir, object_id, size=0, mtime=0):
+        """Add the dirent `name` of the folder `parent_dir`"""
+        index = self._parent_index.get(parent_dir)
+        if index is None:
+            index = self._parent_index[parent_dir] = len(self.parents)
+            self.parents.append(sys.intern(parent_dir))
+        self._ids += binascii.unhexlify(object_id)
+        self._parent_ids.append(index)
+        self.names.append(name)
+        self._isdir.append(1 if isdir else 0)
+        self.sizes.append(0 if isdir else size or 0)
+        self.mtimes.append(mtime or 0)
+
+    def append_json(self, dirent_json, parent_dir):
+        """Add a dirent of a listing of the folder `parent_dir`"""
+        self.append(parent_dir, dirent_json['name'], dirent_json['type'] != 'file',
+                    dirent_json['id'], dirent_json.get('size', 0),
+                    _parse_mtime(dirent_json.get('mtime')))
+
+    def path(self, index):
+        return posixpath.join(self.parents[self._parent_ids[index]], self.names[index])
+
+    def isdir(self, index):
+        return bool(self._isdir[index])
+
+    def id(self, index):
+        if index < 0:
+            index += len(self)
+        return binascii.hexlify(self._ids[index * 20:(index + 1) * 20]).decode('ascii')
+
+    @property
+    def total_size(self):
+        """The total size of the files of the table"""
+        return sum(self.sizes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        cls = SeafDir if self._isdir[index] else SeafFile
+        return cls(self.repo_id, self.path(index), self.id(index),
+                   self.sizes[index], self.client)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
@@ -69,6 +69,8 @@ class AdminGroup(object):
 
 
 class GroupMember(object):
+    __slots__ = ('client', 'group_id', 'name', 'email', 'is_admin', 'role')
+
     def __init__(self, client, group_id, name, email, is_admin, role):
         self.client = client
         self.group_id = group_id
@@ -0,0 +1,167 @@
+import io
+import os
+import stat
+import uuid
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _quote_param(value):
+    """Quote a Content-Disposition parameter the way browsers do"""
+    return value.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+
+def _remaining_size(fileobj):
+    """Return the number of bytes left to read from `fileobj`, or None if it
+    can't be known without reading it (pipes, sockets, ...).
+    """
+    try:
+        fileno = fileobj.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+    else:
+        st = os.fstat(fileno)
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return max(st.st_size - fileobj.tell(), 0)
+
+    try:
+        if not fileobj.seekable():
+            return None
+        pos = fileobj.tell()
+        end = fileobj.seek(0, io.SEEK_END)
+        fileobj.seek(pos)
+        return end - pos
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def content_size(content):
+    """Return the size in bytes of the `content` of a file part, or None if
+    it can't be known without reading it"""
+    if isinstance(content, str):
+        return len(content.encode('utf-8'))
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return memoryview(content).nbytes
+    if isinstance(content, io.TextIOBase) and hasattr(content, 'buffer'):
+        content = content.buffer
+    return _remaining_size(content)
+
+
+class _Part(object):
+    def __init__(self, name, content, filename=None,
+                 content_type='application/octet-stream'):
+        disposition = 'form-data; name="%s"' % _quote_param(name)
+        if filename is not None:
+            disposition += '; filename="%s"' % _quote_param(filename)
+        headers = 'Content-Disposition: %s\r\n' % disposition
+        if filename is not None:
+            headers += 'Content-Type: %s\r\n' % content_type
+        self.headers = (headers + '\r\n').encode('utf-8')
+
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        elif isinstance(content, (bytearray, memoryview)):
+            content = memoryview(content).cast('B')
+        elif isinstance(content, io.TextIOBase) and hasattr(content, 'buffer'):
+            # A file opened in text mode, read the raw bytes instead
+            content = content.buffer
+        self.content = content
+        self.in_memory = isinstance(content, (bytes, memoryview))
+
+        if self.in_memory:
+            self.size = len(content)
+            self.start = None
+        else:
+            self.size = _remaining_size(content)
+            try:
+                self.start = content.tell()
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                self.start = None
+
+    def iter_content(self, chunk_size):
+        if self.in_memory:
+            yield self.content
+            return
+        while True:
+            chunk = self.content.read(chunk_size)
+            if not chunk:
+                break
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            yield chunk
+
+    def rewind(self):
+        if self.start is not None:
+            self.content.seek(self.start)
+
+
+class MultipartEncoder(object):
+    """Encode a multipart/form-data request body lazily.
+
+    The body is produced piece by piece while it is being sent, so file
+    contents are never held in memory as a whole. Pass it as the `data` of a
+    request along with its :attr:`content_type`::
+
+        encoder = MultipartEncoder([('parent_dir', '/'),
+                                    ('file', ('name.txt', fileobj))])
+        client.post(url, data=encoder,
+                    headers={'Content-Type': encoder.content_type})
+
+    `fields` is a list of `(name, value)` pairs, where `value` is either a
+    `str` or `bytes`, or a `(filename, content)` or `(filename, content,
+    content_type)` tuple for a file. `content` may be `str`, `bytes` or a
+    file-like object opened in binary mode.
+
+    When the size of every file is known (bytes, regular files or seekable
+    streams), :attr:`len` is set and the request is sent with a
+    Content-Length. Otherwise (pipes, sockets) :attr:`len` is None and the
+    body is sent with chunked transfer encoding.
+    """
+    def __init__(self, fields, boundary=None, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=%s' % self.boundary
+        self.chunk_size = chunk_size
+
+        self._parts = []
+        for name, value in fields:
+            if isinstance(value, tuple):
+                self._parts.append(_Part(name, value[1], value[0], *value[2:]))
+            else:
+                self._parts.append(_Part(name, value))
+        self._delimiter = ('--%s\r\n' % self.boundary).encode('ascii')
+        self._closing = ('--%s--\r\n' % self.boundary).encode('ascii')
+        self._iterated = False
+
+        self.len = len(self._closing)
+        for part in self._parts:
+            if part.size is None:
+                self.len = None
+                break
+            self.len += len(self._delimiter) + len(part.headers) + part.size + 2
+
+    def __iter__(self):
+        if self._iterated:
+            self.rewind()
+        self._iterated = True
+        for part in self._parts:
+            yield self._delimiter + part.headers
+            for chunk in part.iter_content(self.chunk_size):
+                yield chunk
+            yield b'\r\n'
+        yield self._closing
+
+    def rewind(self):
+        """Go back to the start of the body, so that it can be sent again.
+
+        Raises :exc:`io.UnsupportedOperation` if some file content can't be
+        read again.
+        """
+        for part in self._parts:
+            if not part.in_memory and part.start is None:
+                raise io.UnsupportedOperation('%r can not be rewound' % part.content)
+            part.rewind()
+
+    def to_string(self):
+        """Return the whole encoded body, mostly useful for debugging"""
+        return b''.join(self)
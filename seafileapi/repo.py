@@ -1,5 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from six.moves.urllib.parse import urlencode
-from seafileapi.files import SeafDir, SeafFile
+from seafileapi.files import SeafDir, SeafFile, ZERO_OBJ_ID, BATCH_COPY_MOVE_SIZE, \
+    _list_dir, _batch_copy_move
+from seafileapi.transfer import DEFAULT_TRANSFER_WORKERS
 from seafileapi.utils import raise_does_not_exist
 from seafileapi.exceptions import ClientHttpError, DoesNotExist
 
@@ -8,6 +12,8 @@ class Repo(object):
     """
     A seafile library
     """
+    __slots__ = ('client', 'id', 'name', 'encrypted', 'owner', 'perm')
+
     def __init__(self, client, repo_id, repo_name,
                  encrypted, owner, perm):
         self.client = client
@@ -77,17 +83,89 @@ class Repo(object):
         Return a :class:`SeafDir` object
         """
         assert path.startswith('/')
-        url = '/api2/repos/%s/dir/' % self.id
-        query = '?' + urlencode(dict(p=path))
-        resp = self.client.get(url + query)
-        dir_id = resp.headers['oid']
-        dir_json = resp.json()
+        dir_id, dir_json = _list_dir(self.client, self.id, path)
         dir = SeafDir(self.id, path, dir_id,0,self.client)
 
         if recursive:
             dir.load_entries(dir_json)
         return dir
 
+    def walk(self, path='/', dirs_only=False):
+        """Walk the tree below the folder `path` of this repo like
+        :func:`os.walk` does, see :meth:`SeafDir.walk`.
+        """
+        assert path.startswith('/')
+        seafdir = SeafDir(self.id, path, ZERO_OBJ_ID, 0, self.client)
+        return seafdir.walk(dirs_only)
+
+    def load_tree(self, path='/', table=None, dirs_only=False):
+        """List every file and folder below the folder `path` of this repo
+        into a compact :class:`seafileapi.files.DirentTable`, see
+        :meth:`SeafDir.load_tree`.
+        """
+        assert path.startswith('/')
+        seafdir = SeafDir(self.id, path, ZERO_OBJ_ID, 0, self.client)
+        return seafdir.load_tree(table, dirs_only)
+
+    def get_download_links(self, files, workers=DEFAULT_TRANSFER_WORKERS):
+        """Return the download links of `files`, :class:`SeafFile` objects
+        of this repo, asking for up to `workers` of them at once.
+
+        The links are kept in `client.download_links`, so that reading the
+        files afterwards only takes a request to the fileserver each.
+        """
+        def get_link(seaffile):
+            assert seaffile.repo_id == self.id
+            return seaffile._get_download_link()[0]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(get_link, files))
+
+    def batch_copy(self, names, src_dir, dst_repo, dst_dir,
+                   batch_size=BATCH_COPY_MOVE_SIZE, timeout=None):
+        """Copy many files and folders of the folder `src_dir` of this repo
+        into the folder `dst_dir` of `dst_repo`.
+
+        :param:names The names of the dirents, or their :class:`SeafFile`
+        and :class:`SeafDir` objects
+        :param:dst_repo The destination :class:`Repo` or its id, None for
+        this repo
+        :param:batch_size The max number of dirents handled by one request
+        :param:timeout How long to wait for each background task, in seconds
+
+        Within a repo each batch is copied by one synchronous request.
+        Across repos each one is queued as a background task on the server,
+        whose progress is then polled.
+
+        Return a list of :class:`SeafFile` and :class:`SeafDir` objects of
+        the copies.
+        """
+        dst_repo_id = self._repo_id_of(dst_repo)
+        return _batch_copy_move(self.client, 'copy', self.id, src_dir, names,
+                                dst_repo_id, dst_dir, batch_size, timeout)
+
+    def batch_move(self, names, src_dir, dst_repo, dst_dir,
+                   batch_size=BATCH_COPY_MOVE_SIZE, timeout=None):
+        """Move many files and folders of the folder `src_dir` of this repo
+        into the folder `dst_dir` of `dst_repo`, see :meth:`batch_copy`.
+
+        The dirent objects given in `names` are updated to point to their
+        new location.
+
+        Return a list of :class:`SeafFile` and :class:`SeafDir` objects of
+        the moved dirents.
+        """
+        dst_repo_id = self._repo_id_of(dst_repo)
+        return _batch_copy_move(self.client, 'move', self.id, src_dir, names,
+                                dst_repo_id, dst_dir, batch_size, timeout)
+
+    def _repo_id_of(self, repo):
+        if repo is None:
+            return self.id
+        if isinstance(repo, Repo):
+            return repo.id
+        return repo
+
     def is_exist_dir(self,path):
         '''
         Determine whether the path exists
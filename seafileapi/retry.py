@@ -0,0 +1,106 @@
+import io
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+# Throttling and the failover blips of a load balancer
+RETRY_STATUSES = (429, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30
+DEFAULT_MAX_RETRY_AFTER = 120
+
+
+def parse_retry_after(value):
+    """Return the number of seconds to wait according to the value of a
+    Retry-After header, which is either a number of seconds or a http date,
+    or None if it can't be parsed"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when is None:
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+def is_replayable(data):
+    """Whether a request body `data` can be sent again after a failed
+    attempt"""
+    if data is None or isinstance(data, (bytes, str, dict, list, tuple)):
+        return True
+    # A seafileapi.multipart.MultipartEncoder can go back to its start,
+    # unless it streams a pipe or a socket
+    rewind = getattr(data, 'rewind', None)
+    if rewind is None:
+        return False
+    try:
+        rewind()
+    except io.UnsupportedOperation:
+        return False
+    return True
+
+
+class RetryPolicy(object):
+    """Which failed requests are sent again, and after how long.
+
+    A request is retried when its method is one of `methods` and it either
+    got one of `statuses` as response, or failed to connect or timed out.
+    Only idempotent methods are retried by default, as a POST that failed
+    midway might still have been applied by the server.
+
+    The n-th retry waits a random time between 0 and `backoff` * 2 ** (n -
+    1) seconds, capped to `max_backoff` ("full jitter"), so that many
+    clients don't retry all at once. When `respect_retry_after` is set, the
+    delay asked by a Retry-After header is used instead, up to
+    `max_retry_after` seconds.
+    """
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, methods=IDEMPOTENT_METHODS,
+                 statuses=RETRY_STATUSES, backoff=DEFAULT_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF, jitter=True,
+                 respect_retry_after=True, max_retry_after=DEFAULT_MAX_RETRY_AFTER):
+        """
+        :param:`max_attempts` how many times a request is sent at most,
+        1 disables retries
+        """
+        self.max_attempts = max_attempts
+        self.methods = frozenset(method.upper() for method in methods)
+        self.statuses = frozenset(statuses)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def __repr__(self):
+        return '<{} attempts={} methods={} statuses={}>'.format(
+            self.__class__.__name__, self.max_attempts,
+            ','.join(sorted(self.methods)), ','.join(map(str, sorted(self.statuses))))
+
+    def should_retry(self, method, attempt, status=None):
+        """Whether the `attempt`-th sending of a `method` request, which got
+        a `status` response, or no response at all if None, is retried"""
+        if attempt >= self.max_attempts or method.upper() not in self.methods:
+            return False
+        return status is None or status in self.statuses
+
+    def get_delay(self, attempt, retry_after=None):
+        """Return how many seconds to wait before sending a request again
+        after its `attempt`-th failure"""
+        if self.respect_retry_after:
+            seconds = parse_retry_after(retry_after)
+            if seconds is not None:
+                return min(seconds, self.max_retry_after)
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
@@ -0,0 +1,193 @@
+import bisect
+import re
+import threading
+import time
+
+from six.moves.urllib.parse import urlparse
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_FILESERVER_TOKEN = re.compile(r'^(/seafhttp)?/(files|upload-api|update-api|upload-aj|'
+                               r'update-aj|zip|repos)/[^/]+(/.*)?$')
+_UUID = re.compile(r'/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(?=/|$)')
+_OBJECT_ID = re.compile(r'/[0-9a-f]{40}(?=/|$)')
+_NUMBER = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_template(url):
+    """Return the path of `url` with its ids and tokens replaced by
+    placeholders, like "/api2/repos/{repo_id}/dir/", so that the requests
+    to the same endpoint are counted together"""
+    path = urlparse(url).path
+    match = _FILESERVER_TOKEN.match(path)
+    if match:
+        return '%s/%s/{token}' % (match.group(1) or '', match.group(2))
+    path = _UUID.sub('/{repo_id}', path)
+    path = _OBJECT_ID.sub('/{id}', path)
+    return _NUMBER.sub('/{n}', path)
+
+
+class RequestRecord(object):
+    """A request sent by the client, as passed to the stats hooks.
+
+    `elapsed` covers the whole call, including the throttle waits and the
+    sleeps between retries, while `latency` is the time the last attempt
+    took from being sent to getting the response headers, or None if it
+    wasn't sent.
+    """
+    __slots__ = ('method', 'url', 'endpoint', 'start', 'elapsed', 'latency', 'status',
+                 'attempts', 'bytes_sent', 'bytes_received', 'error')
+
+    def __init__(self, method, url):
+        self.method = method.upper()
+        self.url = url
+        self.endpoint = endpoint_template(url)
+        self.start = time.time()
+        self.elapsed = None
+        self.latency = None
+        self.status = None
+        self.attempts = 1
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.error = None
+
+    def __repr__(self):
+        return '<{} {} {} status={}>'.format(self.__class__.__name__, self.method,
+                                             self.endpoint, self.status)
+
+
+class EndpointStats(object):
+    """The counters of the requests of one method to one endpoint.
+
+    `total_time` adds up the `elapsed` time of the calls, while the latency
+    histogram counts the `latency` of the server, see :class:`RequestRecord`.
+    """
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_time = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def __repr__(self):
+        return '<{} count={} errors={} mean={:.3f}s>'.format(
+            self.__class__.__name__, self.count, self.errors, self.mean_time)
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """Return an upper bound of the `q` (0 to 100) percentile of the
+        latency, from the histogram buckets"""
+        rank = self.count * q / 100.0
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def add(self, record):
+        self.count += 1
+        if record.error is not None or record.status is None or record.status >= 400:
+            self.errors += 1
+        self.retries += record.attempts - 1
+        self.bytes_sent += record.bytes_sent
+        self.bytes_received += record.bytes_received
+        self.total_time += record.elapsed
+        latency = record.latency if record.latency is not None else record.elapsed
+        self.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def to_dict(self):
+        buckets = dict(zip(LATENCY_BUCKETS, self.latency_buckets))
+        buckets[float('inf')] = self.latency_buckets[-1]
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'total_time': self.total_time,
+            'latency_buckets': buckets,
+        }
+
+
+class ClientStats(object):
+    """Counters of the requests sent by a client, per method and endpoint
+    template, see :func:`endpoint_template`.
+
+    `on_request_start` and `on_request_end` are lists of callables called
+    with the :class:`RequestRecord` of every request, before it is sent and
+    once it completed or failed, e.g. to export metrics. They are called in
+    the thread sending the request and should be quick.
+
+    Set :attr:`enabled` to False to stop recording and calling the hooks.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.on_request_start = []
+        self.on_request_end = []
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        """Return the :class:`EndpointStats` of a `(method, endpoint)` key"""
+        return self._endpoints[key]
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._endpoints))
+
+    def __len__(self):
+        return len(self._endpoints)
+
+    @property
+    def total(self):
+        """The :class:`EndpointStats` of all the requests together"""
+        total = EndpointStats()
+        with self._lock:
+            for stats in self._endpoints.values():
+                total.count += stats.count
+                total.errors += stats.errors
+                total.retries += stats.retries
+                total.bytes_sent += stats.bytes_sent
+                total.bytes_received += stats.bytes_received
+                total.total_time += stats.total_time
+                total.latency_buckets = [a + b for a, b in zip(total.latency_buckets,
+                                                               stats.latency_buckets)]
+        return total
+
+    def request_started(self, method, url):
+        """Return the record of a request about to be sent, or None if the
+        stats are disabled"""
+        if not self.enabled:
+            return None
+        record = RequestRecord(method, url)
+        for hook in self.on_request_start:
+            hook(record)
+        return record
+
+    def request_ended(self, record):
+        record.elapsed = time.time() - record.start
+        key = (record.method, record.endpoint)
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = EndpointStats()
+            stats.add(record)
+        for hook in self.on_request_end:
+            hook(record)
+
+    def snapshot(self):
+        """Return the counters as a dict keyed by "METHOD endpoint" """
+        with self._lock:
+            items = list(self._endpoints.items())
+            return dict(('%s %s' % key, stats.to_dict()) for key, stats in items)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
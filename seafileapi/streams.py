@@ -0,0 +1,282 @@
+import hashlib
+import io
+from collections import OrderedDict
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_HASH_NAME = 'sha1'
+DEFAULT_BLOCK_SIZE = 256 * 1024
+DEFAULT_READAHEAD = 4
+DEFAULT_CACHE_BLOCKS = 16
+
+
+class DownloadStream(io.RawIOBase):
+    """A readable file-like object over the body of a streamed
+    :class:`requests.Response`.
+
+    Only `chunk`-sized pieces of the body are held in memory at any time. A
+    checksum of the bytes read so far is computed on the fly, see
+    :attr:`checksum`.
+
+    The bytes read are also written to `cache_writer`, a
+    :class:`seafileapi.cache.ContentWriter`, which is committed once the
+    whole body was read and aborted if the stream is closed before.
+    """
+    def __init__(self, resp, hash_name=DEFAULT_HASH_NAME, cache_writer=None):
+        super(DownloadStream, self).__init__()
+        self._resp = resp
+        self._hasher = hashlib.new(hash_name) if hash_name else None
+        self._cache_writer = cache_writer
+        # How much of the content was read from its start without gaps
+        self._contiguous = 0
+        self.bytes_read = 0
+
+    @property
+    def checksum(self):
+        """Hex digest of the content from its start up to the furthest byte
+        read, or None if no hash is computed or a part of the content was
+        skipped"""
+        if self._hasher is None:
+            return None
+        return self._hasher.hexdigest()
+
+    def readable(self):
+        return True
+
+    def _read(self, size):
+        return self._resp.raw.read(size, decode_content=True)
+
+    def readinto(self, b):
+        data = self._read(len(b))
+        n = len(data)
+        b[:n] = data
+        self._consume(self._contiguous, data)
+        if not n and len(b):
+            # The whole body was read
+            self._commit_cache()
+        return n
+
+    def _consume(self, offset, data):
+        """Hash and cache `data`, read at `offset` of the content, as long
+        as the content is read contiguously from its start"""
+        self.bytes_read += len(data)
+        end = offset + len(data)
+        if offset > self._contiguous:
+            self._hasher = None
+            self._abort_cache()
+            return
+        if end <= self._contiguous:
+            return
+        if offset < self._contiguous:
+            data = data[self._contiguous - offset:]
+        self._contiguous = end
+        if self._hasher is not None:
+            self._hasher.update(data)
+        if self._cache_writer is not None:
+            try:
+                self._cache_writer.write(data)
+            except (IOError, OSError):
+                # A full or read-only disk shouldn't fail the download
+                self._abort_cache()
+
+    def set_cache_writer(self, writer):
+        """Write the content to `writer` from now on, which is only possible
+        as long as nothing was read yet"""
+        if self._contiguous or self._cache_writer is not None:
+            if writer is not None:
+                writer.abort()
+            return
+        self._cache_writer = writer
+
+    def _commit_cache(self):
+        writer, self._cache_writer = self._cache_writer, None
+        if writer is None:
+            return
+        try:
+            writer.commit()
+        except (IOError, OSError):
+            writer.abort()
+
+    def _abort_cache(self):
+        writer, self._cache_writer = self._cache_writer, None
+        if writer is not None:
+            writer.abort()
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield the remaining content in pieces of at most `chunk_size` bytes"""
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        if not self.closed:
+            self._abort_cache()
+            self._resp.close()
+        super(DownloadStream, self).close()
+
+
+class CachedStream(DownloadStream):
+    """A seekable :class:`DownloadStream` over a content read from the local
+    file object `fileobj`, e.g. an entry of a
+    :class:`seafileapi.cache.ContentCache`"""
+    def __init__(self, fileobj, hash_name=DEFAULT_HASH_NAME):
+        super(CachedStream, self).__init__(fileobj, hash_name)
+
+    def readinto(self, b):
+        offset = self._resp.tell()
+        data = self._resp.read(len(b))
+        n = len(data)
+        b[:n] = data
+        self._consume(offset, data)
+        return n
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._resp.seek(offset, whence)
+
+    def tell(self):
+        return self._resp.tell()
+
+
+class RangeReader(DownloadStream):
+    """A seekable file-like object over a remote content of `size` bytes,
+    which is fetched by blocks with http Range requests, so that e.g. the
+    footer of a large file can be read without downloading all of it.
+
+    `get_range(start, end)` returns the bytes from `start` to `end`
+    (excluded) of the content. If the server ignores the range and sends
+    the whole content, it returns a readable stream of it instead, which
+    the reader then goes through once: the content is still read by blocks,
+    but reading before the furthest block fetched raises :exc:`IOError`
+    unless that block is still kept in memory.
+
+    The content is fetched by blocks of `block_size` bytes. While the reads
+    are sequential, the next `readahead` blocks are fetched along with the
+    one being read, in a single request. The last `cache_blocks` blocks
+    fetched are kept in memory, so that reading around the same place again
+    takes no request.
+
+    Like with :class:`DownloadStream`, a checksum is computed and the
+    content is written to `cache_writer`, as long as the content is read
+    contiguously from its start.
+    """
+    def __init__(self, get_range, size, hash_name=DEFAULT_HASH_NAME,
+                 block_size=DEFAULT_BLOCK_SIZE, readahead=DEFAULT_READAHEAD,
+                 cache_blocks=DEFAULT_CACHE_BLOCKS, cache_writer=None):
+        super(RangeReader, self).__init__(None, hash_name, cache_writer)
+        self._get_range = get_range
+        self.size = size
+        self.block_size = block_size
+        self.readahead = readahead
+        self.cache_blocks = max(cache_blocks, readahead + 1)
+        self._blocks = OrderedDict()
+        self._pos = 0
+        self._last_end = 0
+        # The whole content, if the server ignores ranges
+        self._stream = None
+        self._stream_pos = 0
+        self.requests = 0
+        if size == 0:
+            self._commit_cache()
+
+    def __repr__(self):
+        return '<{} size={} pos={}>'.format(self.__class__.__name__, self.size, self._pos)
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError('invalid whence (%r)' % whence)
+        if pos < 0:
+            raise ValueError('negative seek position %d' % pos)
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        n = 0
+        while n < len(view) and self._pos < self.size:
+            index, offset = divmod(self._pos, self.block_size)
+            block = self._get_block(index, self._pos + len(view) - n)
+            data = block[offset:offset + len(view) - n]
+            view[n:n + len(data)] = data
+            self._consume(self._pos, data)
+            self._pos += len(data)
+            n += len(data)
+        if self._contiguous == self.size:
+            self._commit_cache()
+        self._last_end = self._pos
+        return n
+
+    def _get_block(self, index, end):
+        """Return the block `index`, fetching it along with the missing
+        blocks that follow up to the offset `end` of the read, and the
+        readahead blocks if the reads are sequential"""
+        block = self._blocks.get(index)
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+
+        last = (min(end, self.size) - 1) // self.block_size
+        if self._pos == self._last_end:
+            last += self.readahead
+        last = min(last, (self.size - 1) // self.block_size,
+                   index + self.cache_blocks - 1)
+        count = 1
+        while index + count <= last and index + count not in self._blocks:
+            count += 1
+        start = index * self.block_size
+        end = min(self.size, (index + count) * self.block_size)
+        data = self._fetch(start, end)
+        if len(data) != end - start:
+            raise IOError('Expected %d bytes at offset %d, but got %d' %
+                          (end - start, start, len(data)))
+        for i in range(count):
+            self._blocks[index + i] = data[i * self.block_size:(i + 1) * self.block_size]
+        while len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+        return self._blocks[index]
+
+    def _fetch(self, start, end):
+        """Return the bytes from `start` to `end` (excluded), from a new
+        request or from the stream of the whole content"""
+        if self._stream is None:
+            data = self._get_range(start, end)
+            self.requests += 1
+            if not hasattr(data, 'read'):
+                return data
+            self._stream, self._stream_pos = data, 0
+        if start < self._stream_pos:
+            raise IOError('Cannot read back at offset %d, the server does not support '
+                          'ranges' % start)
+        parts = []
+        while self._stream_pos < end:
+            chunk = self._stream.read(min(end, self._stream_pos + DEFAULT_CHUNK_SIZE) -
+                                      self._stream_pos)
+            if not chunk:
+                break
+            if self._stream_pos + len(chunk) > start:
+                parts.append(chunk[max(0, start - self._stream_pos):])
+            self._stream_pos += len(chunk)
+        return b''.join(parts)
+
+    def close(self):
+        if not self.closed:
+            self._abort_cache()
+            self._blocks.clear()
+            if self._stream is not None:
+                self._stream.close()
+        io.RawIOBase.close(self)
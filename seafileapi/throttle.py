@@ -0,0 +1,151 @@
+import threading
+import time
+
+DEFAULT_MIN_RATE = 1.0
+# How fast an adaptive rate grows back after a 429, relative to itself
+RATE_INCREASE = 0.05
+# 429s within this many seconds of a decrease don't decrease the rate again
+ADAPT_INTERVAL = 1.0
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class Limit(object):
+    """A token bucket rate limit combined with a max number of requests in
+    flight, shared by the threads sending a class of requests.
+
+    `rate` is the max number of requests per second, with bursts of up to
+    `burst` requests (one second worth of requests by default). None means
+    no limit.
+
+    When `adaptive` is set, the rate is halved whenever the server answers
+    429 Too Many Requests, down to `min_rate`, and grows back by 5% every
+    second as long as requests succeed, up to `rate`. A Limit without a rate
+    starts from the rate it measured when the first 429 comes.
+    """
+    def __init__(self, rate=None, burst=None, max_in_flight=None,
+                 adaptive=True, min_rate=DEFAULT_MIN_RATE):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.adaptive = adaptive
+        self.min_rate = min_rate
+        self._semaphore = None
+        if max_in_flight:
+            self._semaphore = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._tokens = self._capacity()
+        self._updated = now
+        self._last_change = now - ADAPT_INTERVAL
+        self._window_start = now
+        self._window_count = 0
+        self._measured_rate = 0.0
+
+    def __repr__(self):
+        return '<{} rate={} max_in_flight={}>'.format(self.__class__.__name__,
+                                                     self.rate, self.max_in_flight)
+
+    def _capacity(self):
+        if self.rate is None:
+            return 0
+        return self.burst or max(1.0, self.rate)
+
+    def acquire(self):
+        """Wait until a request may be sent"""
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        delay = self._take_token()
+        while delay > 0:
+            time.sleep(delay)
+            delay = self._take_token()
+
+    def release(self, status=None):
+        """Tell that the request is done, `status` being its response
+        status, or None if it got no response"""
+        if self._semaphore is not None:
+            self._semaphore.release()
+        if not self.adaptive or status is None:
+            return
+        if status == 429:
+            self._decrease()
+        elif self.rate is not None and self.rate != self.max_rate:
+            self._increase()
+
+    def _take_token(self):
+        """Take a token from the bucket, or return how long to wait for one"""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate is not None:
+                self._tokens = min(self._capacity(),
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens < 1:
+                    return (1 - self._tokens) / self.rate
+                self._tokens -= 1
+
+            if now - self._window_start >= 1.0:
+                self._measured_rate = self._window_count / (now - self._window_start)
+                self._window_start, self._window_count = now, 0
+            self._window_count += 1
+            return 0
+
+    def _decrease(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.rate is not None and now - self._last_change < ADAPT_INTERVAL:
+                return
+            rate = self.rate
+            if rate is None:
+                rate = max(self._measured_rate, self._window_count, 2 * self.min_rate)
+            self.rate = max(self.min_rate, rate / 2.0)
+            self._tokens = min(self._tokens, 1)
+            self._updated = self._last_change = now
+
+    def _increase(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.rate is None or now - self._last_change < ADAPT_INTERVAL:
+                return
+            rate = self.rate * (1 + RATE_INCREASE)
+            if self.max_rate is not None:
+                rate = min(rate, self.max_rate)
+            self.rate = rate
+            self._last_change = now
+
+
+class Throttle(object):
+    """The rate and concurrency limits of the requests of a client.
+
+    Every request goes through the :class:`Limit` of its traffic, `api` for
+    seahub and `fileserver` for seafhttp, and the one of its endpoint class:
+    `listing` for seahub reads, `mutation` for seahub writes and `transfer`
+    for the fileserver. A None limit doesn't restrict anything.
+
+    When `adaptive` is set, the missing traffic limits default to ones that
+    have no fixed rate but adapt to 429 responses, see :class:`Limit`.
+    """
+    def __init__(self, api=None, fileserver=None, listing=None, mutation=None,
+                 transfer=None, adaptive=True):
+        if adaptive:
+            api = api if api is not None else Limit()
+            fileserver = fileserver if fileserver is not None else Limit()
+        self.api = api
+        self.fileserver = fileserver
+        self.listing = listing
+        self.mutation = mutation
+        self.transfer = transfer
+
+    def limits_for(self, method, fileserver=False):
+        """Return the limits a `method` request goes through, in the order
+        they are acquired"""
+        if fileserver:
+            limits = (self.transfer, self.fileserver)
+        elif method.upper() in READ_METHODS:
+            limits = (self.listing, self.api)
+        else:
+            limits = (self.mutation, self.api)
+        return [limit for limit in limits if limit is not None]
+
+
+NO_THROTTLE = Throttle(adaptive=False)
@@ -0,0 +1,131 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TRANSFER_WORKERS = 4
+
+
+class TransferResult(object):
+    """The outcome of the transfer of a single file of a tree"""
+    def __init__(self, local_path, remote_path, size=0, elapsed=0.0,
+                 error=None, skipped=False):
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.size = size
+        self.elapsed = elapsed
+        self.error = error
+        self.skipped = skipped
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.error is not None:
+            status = 'error=%r' % self.error
+        elif self.skipped:
+            status = 'skipped'
+        else:
+            status = 'size=%s' % self.size
+        return '<{} "{}" {}>'.format(self.__class__.__name__, self.remote_path, status)
+
+
+class TransferReport(object):
+    """The per-file results and aggregate numbers of a tree transfer"""
+    def __init__(self, results, elapsed):
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.succeeded and not r.skipped]
+
+    @property
+    def skipped(self):
+        return [r for r in self.results if r.skipped]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.succeeded]
+
+    @property
+    def bytes_transferred(self):
+        return sum(r.size for r in self.succeeded)
+
+    @property
+    def throughput(self):
+        """Bytes transferred per second"""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.bytes_transferred / self.elapsed
+
+    def __repr__(self):
+        return '<{} files={} skipped={} failed={} bytes={} elapsed={:.2f}s>'.format(
+            self.__class__.__name__, len(self.succeeded), len(self.skipped),
+            len(self.failed), self.bytes_transferred, self.elapsed)
+
+
+class BatchResult(object):
+    """The outcome of one request of a batch operation on many dirents"""
+    def __init__(self, names, elapsed=0.0, error=None):
+        self.names = names
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = 'ok' if self.error is None else 'error=%r' % self.error
+        return '<{} names={} {}>'.format(self.__class__.__name__, len(self.names), status)
+
+
+def run_batches(func, batches, workers=DEFAULT_TRANSFER_WORKERS):
+    """Call `func(batch)` for each of `batches` in a pool of `workers`
+    threads.
+
+    Exceptions are recorded in the result of the batch instead of being
+    raised. Return a list of :class:`BatchResult`, in the order of `batches`.
+    """
+    def run(batch):
+        start = time.time()
+        try:
+            func(batch)
+        except Exception as e:
+            return BatchResult(batch, time.time() - start, e)
+        return BatchResult(batch, time.time() - start)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, batches))
+
+
+def run_transfers(transfer, jobs, workers=DEFAULT_TRANSFER_WORKERS, callback=None):
+    """Call `transfer(local_path, remote_path)` for each pair of `jobs` in a
+    pool of `workers` threads.
+
+    `transfer` returns the number of bytes transferred, or None if the file
+    was skipped. Exceptions are recorded in the result of the file instead
+    of being raised. `callback` is called with each :class:`TransferResult`
+    as soon as it is available.
+
+    Return a :class:`TransferReport`.
+    """
+    def run(job):
+        local_path, remote_path = job
+        start = time.time()
+        try:
+            size = transfer(local_path, remote_path)
+        except Exception as e:
+            result = TransferResult(local_path, remote_path,
+                                    elapsed=time.time() - start, error=e)
+        else:
+            result = TransferResult(local_path, remote_path, size or 0,
+                                    time.time() - start, skipped=size is None)
+        if callback is not None:
+            callback(result)
+        return result
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, jobs))
+    return TransferReport(results, time.time() - start)
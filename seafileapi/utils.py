@@ -1,3 +1,6 @@
+import codecs
+import json
+import re
 import string
 import sys
 import random
@@ -60,3 +63,99 @@ def utf8lize(obj):
         return obj.encode('utf-8')
 
     return obj
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*$')
+_json_decoder = json.JSONDecoder()
+
+class _JsonReader(object):
+    """Read JSON values one at a time from an iterable of utf-8 byte chunks"""
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self):
+        """Append the next chunk to the buffer, return False at the end of
+        the input"""
+        while not self._eof:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._eof = True
+                text = self._utf8.decode(b'', True)
+            else:
+                text = self._utf8.decode(chunk)
+            if text:
+                self._buf = self._buf[self._pos:] + text
+                self._pos = 0
+                return True
+        return False
+
+    def peek(self):
+        """Skip whitespace and return the next character, or '' at the end
+        of the input"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._read_more():
+                return ''
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of `chars`"""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('Expected one of %r but got %r' % (chars, char))
+        self._pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                if not self._read_more():
+                    raise
+                continue
+            # A number might go on in the next chunk
+            if _NUMBER_TAIL.match(self._buf, end) and self._read_more():
+                continue
+            self._pos = end
+            return value
+
+def iter_json_array(chunks, key=None):
+    """Parse a JSON array incrementally and yield its items one by one.
+
+    :param:chunks An iterable of utf-8 encoded byte strings, like
+    :meth:`requests.Response.iter_content`
+    :param:key If the document is an object, the key of the array in it
+
+    Only the item being parsed is held in memory, so arbitrarily large
+    arrays can be processed as they are downloaded. Raises :exc:`ValueError`
+    on malformed input and :exc:`KeyError` if the object has no `key`.
+    """
+    reader = _JsonReader(chunks)
+    if key is not None:
+        reader.expect('{')
+        if reader.peek() == '}':
+            raise KeyError(key)
+        while True:
+            name = reader.value()
+            reader.expect(':')
+            if name == key:
+                break
+            reader.value()
+            if reader.expect(',}') == '}':
+                raise KeyError(key)
+
+    reader.expect('[')
+    if reader.peek() == ']':
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
@@ -0,0 +1,260 @@
+"""Extract a zip archive while it is being downloaded.
+
+The entries of a zip archive are read in order from their local headers,
+without the central directory at the end of the archive, so that nothing
+needs to be stored first. Entries whose sizes are only known after their
+data (in a "data descriptor"), and zip64 entries, are supported.
+"""
+import os
+import struct
+import zlib
+from zipfile import BadZipFile
+
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+CENTRAL_HEADER_SIGNATURE = b'PK\x01\x02'
+END_SIGNATURE = b'PK\x05\x06'
+DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+ZIP64_EXTRA_ID = 0x0001
+ZIP64_LIMIT = 0xffffffff
+
+FLAG_ENCRYPTED = 0x01
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+
+STORED = 0
+DEFLATED = 8
+
+_LOCAL_HEADER = struct.Struct('<HHHHHIIIHH')
+_DESCRIPTOR = struct.Struct('<III')
+_DESCRIPTOR64 = struct.Struct('<IQQ')
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class _Input(object):
+    """Reads exact amounts of bytes from a stream, with the ability to push
+    back bytes read too far"""
+    def __init__(self, fileobj, chunk_size):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self._pending = b''
+
+    def read(self, size=None):
+        """Return up to `size` bytes, or a chunk if `size` is None. Only
+        returns b'' at the end of the stream."""
+        if self._pending:
+            if size is None or size >= len(self._pending):
+                data, self._pending = self._pending, b''
+            else:
+                data, self._pending = self._pending[:size], self._pending[size:]
+            return data
+        return self.fileobj.read(size or self.chunk_size)
+
+    def read_exact(self, size):
+        parts = []
+        while size > 0:
+            data = self.read(size)
+            if not data:
+                raise BadZipFile('Truncated zip archive')
+            parts.append(data)
+            size -= len(data)
+        return b''.join(parts)
+
+    def unread(self, data):
+        if data:
+            self._pending = data + self._pending
+
+
+def _safe_path(dest, name):
+    """Return the local path of the member `name` below the folder `dest`,
+    refusing names which would land outside of it"""
+    parts = name.replace('\\', '/').split('/')
+    if name.startswith(('/', '\\')) or (parts and ':' in parts[0]) or '..' in parts:
+        raise BadZipFile('Unsafe path in zip archive: %r' % name)
+    parts = [part for part in parts if part not in ('', '.')]
+    if not parts:
+        raise BadZipFile('Empty member name in zip archive')
+    path = os.path.join(dest, *parts)
+    root = os.path.realpath(dest)
+    real = os.path.realpath(path)
+    if real != root and not real.startswith(root.rstrip(os.sep) + os.sep):
+        raise BadZipFile('Unsafe path in zip archive: %r' % name)
+    return path
+
+
+def _zip64_sizes(extra, csize, usize):
+    """Return the `(csize, usize)` of an entry, taking the zip64 extra field
+    into account, and whether there is one"""
+    offset = 0
+    while offset + 4 <= len(extra):
+        field_id, length = struct.unpack('<HH', extra[offset:offset + 4])
+        if field_id == ZIP64_EXTRA_ID:
+            values = extra[offset + 4:offset + 4 + length]
+            # The zip64 field only holds the sizes which don't fit in the
+            # header, uncompressed size first
+            if usize == ZIP64_LIMIT and len(values) >= 8:
+                usize, = struct.unpack('<Q', values[:8])
+                values = values[8:]
+            if csize == ZIP64_LIMIT and len(values) >= 8:
+                csize, = struct.unpack('<Q', values[:8])
+            return csize, usize, True
+        offset += 4 + length
+    return csize, usize, False
+
+
+def _read_descriptor(source, layout):
+    """Read the data descriptor following the data of an entry, and return
+    its `(crc, csize, usize)`"""
+    data = source.read_exact(4)
+    if data != DESCRIPTOR_SIGNATURE:
+        # The signature is optional
+        source.unread(data)
+    return layout.unpack(source.read_exact(layout.size))
+
+
+def _copy_deflated(source, out):
+    """Inflate the data of an entry to `out`, and return the crc and the
+    sizes read"""
+    decompressor = zlib.decompressobj(-15)
+    crc = csize = usize = 0
+    while not decompressor.eof:
+        data = source.read()
+        if not data:
+            raise BadZipFile('Truncated zip archive')
+        csize += len(data)
+        while data and not decompressor.eof:
+            try:
+                # Bounded, so that a small input can't take all the memory
+                chunk = decompressor.decompress(data, source.chunk_size)
+            except zlib.error as e:
+                raise BadZipFile('Invalid compressed data: %s' % e)
+            crc = zlib.crc32(chunk, crc)
+            usize += len(chunk)
+            out(chunk)
+            data = decompressor.unconsumed_tail
+    csize -= len(decompressor.unused_data)
+    source.unread(decompressor.unused_data)
+    return crc, csize, usize
+
+
+def _copy_stored(source, out, size):
+    crc = 0
+    while size > 0:
+        data = source.read(min(size, source.chunk_size))
+        if not data:
+            raise BadZipFile('Truncated zip archive')
+        crc = zlib.crc32(data, crc)
+        out(data)
+        size -= len(data)
+    return crc
+
+
+def _descriptor_layout(zip64, csize, usize):
+    # Some writers only use a zip64 descriptor when the sizes need it
+    if zip64 or csize >= ZIP64_LIMIT or usize >= ZIP64_LIMIT:
+        return _DESCRIPTOR64
+    return _DESCRIPTOR
+
+
+def _copy_stored_until_descriptor(source, out, zip64):
+    """Copy the data of a stored entry of unknown size to `out`, up to the
+    data descriptor whose crc and size match the data, and return the crc
+    and the size"""
+    tail = len(DESCRIPTOR_SIGNATURE) + _DESCRIPTOR64.size
+    crc = size = 0
+    buf = b''
+    while True:
+        data = source.read()
+        if not data:
+            raise BadZipFile('Truncated zip archive')
+        buf += data
+        pos = buf.find(DESCRIPTOR_SIGNATURE)
+        while 0 <= pos and pos + tail <= len(buf):
+            layout = _descriptor_layout(zip64, size + pos, size + pos)
+            start = pos + len(DESCRIPTOR_SIGNATURE)
+            desc_crc, desc_csize, _ = layout.unpack(buf[start:start + layout.size])
+            if desc_csize == size + pos and desc_crc == zlib.crc32(buf[:pos], crc):
+                out(buf[:pos])
+                source.unread(buf[pos:])
+                return zlib.crc32(buf[:pos], crc), size + pos
+            pos = buf.find(DESCRIPTOR_SIGNATURE, pos + 1)
+        # Keep what might be the start of a descriptor
+        keep = len(buf) - tail + 1
+        if pos >= 0:
+            keep = min(keep, pos)
+        if keep > 0:
+            out(buf[:keep])
+            crc = zlib.crc32(buf[:keep], crc)
+            size += keep
+            buf = buf[keep:]
+
+
+def extract_stream(fileobj, dest, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Extract the zip archive read from the binary stream `fileobj` into
+    the local folder `dest`, as it is read.
+
+    The crc of every file is checked. Members whose paths would land outside
+    of `dest`, like "../x" or "/etc/x", are refused. Encrypted members are
+    not supported.
+
+    Raises :exc:`zipfile.BadZipFile` if the archive is invalid.
+
+    Return the names of the members extracted, in the order of the archive.
+    """
+    source = _Input(fileobj, chunk_size)
+    names = []
+    if not os.path.isdir(dest):
+        os.makedirs(dest)
+    while True:
+        signature = source.read_exact(4)
+        if signature in (CENTRAL_HEADER_SIGNATURE, END_SIGNATURE):
+            return names
+        if signature != LOCAL_HEADER_SIGNATURE:
+            raise BadZipFile('Bad signature %r in zip archive' % signature)
+        (_, flags, method, _, _, crc, csize, usize,
+         name_length, extra_length) = _LOCAL_HEADER.unpack(source.read_exact(_LOCAL_HEADER.size))
+        name = source.read_exact(name_length)
+        name = name.decode('utf-8' if flags & FLAG_UTF8 else 'cp437')
+        extra = source.read_exact(extra_length)
+        csize, usize, zip64 = _zip64_sizes(extra, csize, usize)
+        if flags & FLAG_ENCRYPTED:
+            raise BadZipFile('Encrypted member %r is not supported' % name)
+        if method not in (STORED, DEFLATED):
+            raise BadZipFile('Compression method %d of %r is not supported' % (method, name))
+
+        path = _safe_path(dest, name)
+        is_dir = name.endswith(('/', '\\'))
+        if is_dir:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            fp = None
+            out = lambda data: None
+        else:
+            parent = os.path.dirname(path)
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            fp = open(path, 'wb')
+            out = fp.write
+
+        try:
+            descriptor = flags & FLAG_DATA_DESCRIPTOR
+            if method == DEFLATED:
+                actual_crc, actual_csize, actual_usize = _copy_deflated(source, out)
+            elif descriptor:
+                actual_crc, actual_csize = _copy_stored_until_descriptor(source, out, zip64)
+                actual_usize = actual_csize
+            else:
+                actual_crc = _copy_stored(source, out, csize)
+                actual_csize = actual_usize = csize
+            if descriptor:
+                layout = _descriptor_layout(zip64, actual_csize, actual_usize)
+                crc, csize, usize = _read_descriptor(source, layout)
+            if (actual_crc, actual_csize, actual_usize) != (crc, csize, usize):
+                raise BadZipFile('Bad crc or size of member %r' % name)
+        except BaseException:
+            if fp is not None:
+                fp.close()
+                os.remove(path)
+            raise
+        if fp is not None:
+            fp.close()
+        names.append(name)
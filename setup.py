@@ -13,6 +13,7 @@ setup(name='seafileapi',
       platforms=['Any'],
       packages=find_packages(),
       install_requires=['six', 'requests'],
+      extras_require={'async': ['aiohttp']},
       classifiers=['Development Status :: 4 - Beta',
                    'License :: OSI Approved :: BSD License',
                    'Operating System :: OS Independent',
@@ -0,0 +1,30 @@
+#coding: UTF-8
+
+import asyncio
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from seafileapi import aio
+from tests.fixtures import SERVER, USER, PASSWORD
+from tests.utils import randstring
+
+def test_async_upload_and_list(repo):
+    async def run():
+        async with aio.AsyncSeafileApiClient(SERVER, USER, PASSWORD, max_concurrency=8) as client:
+            arepo = await client.repos.get_repo(repo.id)
+            rootdir = await arepo.get_dir('/')
+            parentdir = await rootdir.mkdir('异步目录-%s' % randstring())
+
+            fnames = sorted('file-%d.txt' % i for i in range(20))
+            files = await asyncio.gather(*[parentdir.upload('content of %s' % fname, fname)
+                                           for fname in fnames])
+            assert sorted(f.name for f in files) == fnames
+
+            entries = await parentdir.ls(force_refresh=True)
+            assert sorted(e.name for e in entries) == fnames
+
+            testfile = await arepo.get_file(files[0].path)
+            assert await testfile.get_content() == ('content of %s' % files[0].name).encode()
+
+    asyncio.run(run())
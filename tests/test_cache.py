@@ -0,0 +1,100 @@
+#coding: UTF-8
+
+import os
+import time
+
+from seafileapi.cache import LinkCache, ListingCache, TokenCache, ContentCache
+
+def test_link_cache_expiry():
+    cache = LinkCache(ttl=60)
+    cache.set(('upload', 'repo'), 'http://fileserver/upload-api/token')
+    assert cache.get(('upload', 'repo')) == 'http://fileserver/upload-api/token'
+    assert cache.get(('update', 'repo')) is None
+
+    cache.set(('update', 'repo'), 'http://fileserver/update-api/token', ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get(('update', 'repo')) is None
+
+def test_link_cache_invalidate():
+    cache = LinkCache()
+    cache.set('key', 'old')
+    cache.invalidate('key', 'other')
+    assert cache.get('key') == 'old'
+    cache.invalidate('key', 'old')
+    assert cache.get('key') is None
+
+def test_link_cache_bounded():
+    cache = LinkCache(maxsize=2)
+    for i in range(3):
+        cache.set(i, 'link-%d' % i)
+    assert len(cache) == 2
+    assert cache.get(0) is None
+
+def test_link_cache_disabled():
+    cache = LinkCache(ttl=0)
+    cache.set('key', 'link')
+    assert cache.get('key') is None
+
+def test_listing_cache_lru_bounded_by_bytes():
+    cache = ListingCache(max_bytes=12)
+    cache.set(('repo', '/a'), 'oid-a', b'[1, 2]')
+    cache.set(('repo', '/b'), 'oid-b', b'[3]')
+    assert cache.get(('repo', '/a')) == ('oid-a', b'[1, 2]')
+
+    cache.set(('repo', '/c'), 'oid-c', b'[4, 5]')
+    assert cache.get(('repo', '/b')) is None
+    assert cache.get(('repo', '/a')) == ('oid-a', b'[1, 2]')
+    assert cache.get(('repo', '/c')) == ('oid-c', b'[4, 5]')
+    assert cache.size == 12
+
+    cache.set(('repo', '/huge'), 'oid', b'[' + b'0, ' * 10 + b']')
+    assert cache.get(('repo', '/huge')) is None
+    assert len(cache) == 2
+
+def test_token_cache(tmpdir):
+    path = str(tmpdir.join('cache', 'tokens.json'))
+    cache = TokenCache(path)
+    assert cache.get('http://seafile', 'a@example.com') is None
+
+    cache.set('http://seafile/', 'a@example.com', 'a' * 40)
+    cache.set('http://seafile', 'b@example.com', 'b' * 40)
+    assert TokenCache(path).get('http://seafile', 'a@example.com') == 'a' * 40
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
+    assert 'a@example.com' not in open(path).read()
+
+    cache.invalidate('http://seafile', 'a@example.com')
+    assert cache.get('http://seafile', 'a@example.com') is None
+    assert cache.get('http://seafile', 'b@example.com') == 'b' * 40
+
+    os.chmod(path, 0o644)
+    assert cache.get('http://seafile', 'b@example.com') is None
+
+def test_content_cache(tmpdir):
+    cache = ContentCache(str(tmpdir.join('contents')), max_bytes=25)
+    assert cache.get('a' * 40) is None
+    cache.set('a' * 40, b'x' * 10)
+    assert cache.get('a' * 40) == b'x' * 10
+
+    writer = cache.writer('b' * 40, size=10)
+    writer.write(b'y' * 5)
+    writer.commit()
+    assert cache.get('b' * 40) is None
+
+    writer = cache.writer('b' * 40)
+    writer.write(b'y' * 10)
+    writer.abort()
+    assert cache.get('b' * 40) is None
+
+    cache.set('b' * 40, b'y' * 10)
+    past = time.time() - 60
+    os.utime(str(tmpdir.join('contents', 'bb', 'b' * 40)), (past, past))
+    assert cache.get('a' * 40) == b'x' * 10
+    # Over max_bytes, the least recently used entry goes
+    cache.set('c' * 40, b'z' * 10)
+    assert cache.get('b' * 40) is None
+    assert cache.get('a' * 40) == b'x' * 10
+    assert cache.get('c' * 40) == b'z' * 10
+    assert [name for name in os.listdir(str(tmpdir.join('contents', 'cc')))] == ['c' * 40]
+
+    cache.clear()
+    assert cache.get('a' * 40) is None
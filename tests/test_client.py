@@ -0,0 +1,55 @@
+#coding: UTF-8
+
+from seafileapi.client import SeafileApiClient
+
+def _offline_client(**kwargs):
+    return SeafileApiClient('http://127.0.0.1:8000', token='x' * 40, **kwargs)
+
+def test_fileserver_urls_use_separate_pool():
+    client = _offline_client(pool_maxsize=4, fileserver_pool_maxsize=16)
+    assert client.session is not client.fileserver_session
+
+    api_url = 'http://127.0.0.1:8000/api2/repos/'
+    assert not client.is_fileserver_url(api_url)
+    assert client._session_for(api_url) is client.session
+
+    for url in ['http://127.0.0.1:8000/seafhttp/files/token/a.txt',
+                'http://127.0.0.1:8082/files/token/a.txt']:
+        assert client.is_fileserver_url(url)
+        assert client._session_for(url) is client.fileserver_session
+
+    assert client.session.get_adapter(api_url)._pool_maxsize == 4
+    assert client.fileserver_session.get_adapter(api_url)._pool_maxsize == 16
+    client.close()
+
+class _Response(object):
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {}
+        self._body = body
+
+    def json(self):
+        return self._body
+
+    def close(self):
+        pass
+
+def test_token_cache_and_relogin(tmpdir):
+    from seafileapi.cache import TokenCache
+    cache = TokenCache(str(tmpdir.join('tokens.json')))
+    cache.set('http://127.0.0.1:8000', 'user', 'o' * 40)
+
+    client = SeafileApiClient('http://127.0.0.1:8000', 'user', 'password',
+                              token_cache=cache)
+    assert client._token == 'o' * 40
+
+    sent = []
+    def request(method, url, **kwargs):
+        sent.append(kwargs['headers']['Authorization'])
+        return _Response(401 if len(sent) == 1 else 200)
+    client.session.request = request
+    client.session.post = lambda url, data: _Response(200, {'token': 'n' * 40})
+
+    assert client.get('/api2/repos/').status_code == 200
+    assert sent == ['Token ' + 'o' * 40, 'Token ' + 'n' * 40]
+    assert cache.get('http://127.0.0.1:8000', 'user') == 'n' * 40
@@ -1,8 +1,14 @@
 #coding: UTF-8
 
+import hashlib
 import os
 import pytest
+import requests
+import zipfile
 
+from seafileapi import files
+from seafileapi.cache import ContentCache, DEFAULT_LINK_TTL
+from seafileapi.exceptions import ClientHttpError, OperationError
 from tests.utils import randstring, datafile, filesize
 
 @pytest.mark.parametrize('parentpath', [
@@ -67,7 +73,7 @@ def test_upload_file(repo, parentpath):
 
     assert testfile.size == filesize(fpath)
     assert testfile.name == fname
-    assert testfile.repo.id == repo.id
+    assert testfile.repo_id == repo.id
     assert testfile.get_content() == fcontent, \
         'uploaded file content should be the same with the original file'
     entries = parentdir.ls(force_refresh=True)
@@ -306,7 +312,7 @@ def test_move_file_to_other_repo(client, repo, parentpath):
         testfile.moveTo(temp_dir.path, temp_repo.id)
         assert testfile.path == os.path.join(temp_dir.path, os.path.basename(testfile.path))
         assert len(temp_dir.ls(force_refresh=True)) == 1
-        assert testfile.repo.id == temp_repo.id
+        assert testfile.repo_id == temp_repo.id
     finally:
         temp_repo.delete()
 
@@ -363,7 +369,463 @@ def test_move_folder_to_other_repo(client, repo, parentpath):
         # move a folder
         testfolder.moveTo(tempfolder.path, temp_repo.id)
         assert testfolder.path == os.path.join(tempfolder.path, os.path.basename(testfolder.path))
-        assert testfolder.repo.id == temp_repo.id
+        assert testfolder.repo_id == temp_repo.id
         assert len(tempfolder.ls(force_refresh=True)) == 1
     finally:
         temp_repo.delete()
+
+def test_stream_file_content(repo, tmpdir):
+    rootdir = repo.get_dir('/')
+    fname = 'aliedit.tar.gz'
+    fpath = datafile(fname)
+    with open(fpath, 'rb') as fp:
+        fcontent = fp.read()
+    testfile = rootdir.upload(fcontent, fname)
+
+    assert b''.join(testfile.iter_content(chunk_size=1024)) == fcontent
+
+    localpath = str(tmpdir.join(fname))
+    checksum = testfile.download_to(localpath)
+    with open(localpath, 'rb') as fp:
+        assert fp.read() == fcontent
+    assert checksum == hashlib.sha1(fcontent).hexdigest()
+
+    with testfile.open() as stream:
+        assert stream.read(10) == fcontent[:10]
+        assert stream.read() == fcontent[10:]
+        assert stream.checksum == checksum
+
+def test_open_random_access(repo):
+    rootdir = repo.get_dir('/')
+    content = os.urandom(300000)
+    testfile = rootdir.upload(content, 'blob.bin')
+
+    with testfile.open(block_size=65536) as reader:
+        reader.seek(-1000, os.SEEK_END)
+        assert reader.read() == content[-1000:]
+        reader.seek(1000)
+        assert reader.read(100000) == content[1000:101000]
+        assert reader.requests == 2
+        assert reader.checksum is None
+    with pytest.raises(ValueError):
+        testfile.open('r')
+
+def test_open_without_ranges(repo, monkeypatch):
+    rootdir = repo.get_dir('/')
+    content = os.urandom(300000)
+    testfile = rootdir.upload(content, 'blob.bin')
+
+    get_from_fileserver = files.SeafFile._get_from_fileserver
+    def ignore_ranges(seaffile, link=None, **kwargs):
+        kwargs['headers'].pop('Range')
+        return get_from_fileserver(seaffile, link, **kwargs)
+    monkeypatch.setattr(files.SeafFile, '_get_from_fileserver', ignore_ranges)
+
+    with testfile.open(block_size=10000) as reader:
+        assert reader.read(50000) == content[:50000]
+        reader.seek(200000)
+        assert reader.read() == content[200000:]
+        assert reader.requests == 1
+
+def test_segmented_download(client, repo, tmpdir, monkeypatch):
+    monkeypatch.setattr(files, 'MIN_SEGMENT_SIZE', 1000)
+    rootdir = repo.get_dir('/')
+    content = os.urandom(100000)
+    testfile = rootdir.upload(content, 'blob.bin')
+
+    class _Interrupted(object):
+        """A response whose body stops after its first chunk"""
+        def __init__(self, resp):
+            self.resp = resp
+
+        def iter_content(self, chunk_size):
+            yield next(self.resp.iter_content(1000))
+            raise requests.exceptions.ChunkedEncodingError('interrupted')
+
+        def close(self):
+            self.resp.close()
+
+        def __getattr__(self, name):
+            return getattr(self.resp, name)
+
+    get_from_fileserver = files.SeafFile._get_from_fileserver
+    ranges = []
+    def interrupt_once(seaffile, link=None, **kwargs):
+        interrupt = kwargs['headers']['Range'].startswith('bytes=0-')
+        ranges.append(kwargs['headers']['Range'])
+        resp, oid = get_from_fileserver(seaffile, link, **kwargs)
+        return (_Interrupted(resp) if interrupt else resp), oid
+    monkeypatch.setattr(files.SeafFile, '_get_from_fileserver', interrupt_once)
+
+    localpath = str(tmpdir.join('blob.bin'))
+    checksum = testfile.download_to(localpath, segments=4)
+    with open(localpath, 'rb') as fp:
+        assert fp.read() == content
+    assert checksum == hashlib.sha1(content).hexdigest()
+    assert len(ranges) == 5
+    assert ranges[0].startswith('bytes=0-') and 'bytes=1000-24999' in ranges
+
+    # A file which changed size since it was loaded is downloaded in one go
+    monkeypatch.setattr(files.SeafFile, '_get_from_fileserver', get_from_fileserver)
+    stale = rootdir.upload(content[:50000], 'stale.bin')
+    rootdir.get_file('/stale.bin').update(content)
+    stale.download_to(localpath, segments=4)
+    with open(localpath, 'rb') as fp:
+        assert fp.read() == content
+
+    # So is a file whose server ignores ranges
+    def ignore_ranges(seaffile, link=None, **kwargs):
+        kwargs.get('headers', {}).pop('Range', None)
+        return get_from_fileserver(seaffile, link, **kwargs)
+    monkeypatch.setattr(files.SeafFile, '_get_from_fileserver', ignore_ranges)
+    assert testfile.download_to(localpath, segments=4) == hashlib.sha1(content).hexdigest()
+
+    # A segment whose request fails after the retries of the client resumes
+    failures = []
+    def fail_once(seaffile, link=None, **kwargs):
+        if kwargs['headers']['Range'] == 'bytes=50000-74999' and not failures:
+            failures.append(1)
+            raise ClientHttpError(503, 'Service Unavailable')
+        return get_from_fileserver(seaffile, link, **kwargs)
+    monkeypatch.setattr(files.SeafFile, '_get_from_fileserver', fail_once)
+    monkeypatch.setattr(client.retry, 'get_delay', lambda attempt, retry_after=None: 0)
+    assert testfile.download_to(localpath, segments=4) == hashlib.sha1(content).hexdigest()
+    assert failures == [1]
+
+def test_download_zip(repo, tmpdir):
+    rootdir = repo.get_dir('/')
+    folder = rootdir.mkdir('folder')
+    folder.mkdir('sub').upload(b'b' * 1000, 'b.txt')
+    folder.upload(b'a', 'a.txt')
+    rootdir.upload(b'c', 'c.txt')
+
+    path = str(tmpdir.join('folder.zip'))
+    assert folder.download_zip(path) == os.path.getsize(path)
+    with zipfile.ZipFile(path) as archive:
+        assert archive.read('folder/sub/b.txt') == b'b' * 1000
+
+    names = rootdir.download_zip(str(tmpdir.join('out')), names=['c.txt', 'folder'],
+                                 extract=True)
+    assert 'c.txt' in names and 'folder/a.txt' in names
+    with open(str(tmpdir.join('out', 'folder', 'sub', 'b.txt')), 'rb') as fp:
+        assert fp.read() == b'b' * 1000
+
+def test_download_zip_read_only(client, repo, tmpdir, monkeypatch):
+    rootdir = repo.get_dir('/')
+    rootdir.upload(b'a', 'a.txt')
+    get_fileserver_link = files._get_fileserver_link
+    asked = []
+    def read_only(client, op, repo_id):
+        if op == 'upload':
+            asked.append(repo_id)
+            raise ClientHttpError(403, 'Permission denied')
+        return get_fileserver_link(client, op, repo_id)
+    monkeypatch.setattr(files, '_get_fileserver_link', read_only)
+
+    for i in range(2):
+        names = rootdir.download_zip(str(tmpdir.join('out%d' % i)), extract=True)
+        assert names == ['a.txt']
+    assert asked == [repo.id], 'the default fileserver root is remembered'
+
+def test_zip_task_progress():
+    class _Client(object):
+        def get(self, url):
+            return _Progress()
+    class _Progress(object):
+        def json(self):
+            return {'error_msg': 'Token invalid.'}
+
+    with pytest.raises(OperationError):
+        files._wait_for_zip_task(_Client(), 'token')
+
+def test_content_cache(client, repo, tmpdir):
+    rootdir = repo.get_dir('/')
+    testfile = rootdir.upload(b'cached content', 'a.txt')
+    client.content_cache = ContentCache(str(tmpdir.join('contents')))
+    client.download_links.ttl = 0
+    try:
+        client.stats.reset()
+        with testfile.open() as stream:
+            assert stream.read() == b'cached content'
+        assert client.stats.total.count == 2, 'a link and a range request'
+        client.download_links.ttl = DEFAULT_LINK_TTL
+        client.stats.reset()
+        assert testfile.get_content() == b'cached content'
+        assert b''.join(testfile.iter_content()) == b'cached content'
+        assert len(client.stats) == 0
+
+        testfile.update(b'new content')
+        assert testfile.get_content() == b'new content'
+        assert client.content_cache.get(testfile.id) == b'new content'
+
+        # The content of a changed file is only cached under its new id
+        stale = rootdir.upload(b'AAAAA', 'b.txt')
+        rootdir.get_file('/b.txt').update(b'BBBBB')
+        assert stale.get_content() == b'BBBBB'
+        with stale.open() as stream:
+            with pytest.raises(OperationError):
+                stream.read()
+        assert b''.join(stale.iter_content()) == b'BBBBB'
+        assert stale.id not in client.content_cache
+        other = rootdir.upload(b'AAAAA', 'other.txt')
+        assert other.get_content() == b'AAAAA'
+    finally:
+        client.content_cache = None
+        client.download_links.ttl = DEFAULT_LINK_TTL
+
+def test_download_link_reuse(client, repo):
+    rootdir = repo.get_dir('/')
+    seaffiles = [rootdir.upload(b'content %d' % i, 'f%d.txt' % i) for i in range(3)]
+    links = repo.get_download_links(seaffiles)
+    assert len(set(links)) == 3
+
+    client.stats.reset()
+    assert [f.get_content() for f in seaffiles] == [b'content %d' % i for i in range(3)]
+    assert seaffiles[0].get_content() == b'content 0'
+    assert [key[1] for key in client.stats] == ['/seafhttp/files/{token}']
+
+    # An expired link is replaced
+    key = ('download', repo.id, seaffiles[0].id)
+    client.download_links.set(key, links[0].replace('/files/', '/files/x'))
+    assert seaffiles[0].get_content() == b'content 0'
+    assert client.download_links.get(key) != links[0]
+
+    seaffiles[1].update(b'new content')
+    assert seaffiles[1].get_content() == b'new content'
+
+def test_download_link_of_changed_file(client, repo):
+    rootdir = repo.get_dir('/')
+    stale = rootdir.upload(b'AAAAA', 'a.txt')
+    rootdir.get_file('/a.txt').update(b'BBBBB')
+    assert stale.get_content() == b'BBBBB'
+
+    # The link to the new content isn't reused for the old one
+    assert client.download_links.get(('download', repo.id, stale.id)) is None
+    other = rootdir.upload(b'AAAAA', 'other.txt')
+    assert other.id == stale.id
+    assert other.get_content() == b'AAAAA'
+
+def test_upload_large_file(repo, tmpdir):
+    rootdir = repo.get_dir('/')
+    fname = 'aliedit.tar.gz'
+    fpath = datafile(fname)
+    with open(fpath, 'rb') as fp:
+        fcontent = fp.read()
+
+    state_path = str(tmpdir.join('upload-state'))
+    testfile = rootdir.upload_large(fpath, chunk_size=len(fcontent) // 3 + 1,
+                                    state_path=state_path)
+    assert testfile.name == fname
+    assert testfile.size == filesize(fpath)
+    assert testfile.get_content() == fcontent
+    assert not os.path.exists(state_path)
+
+def test_update_file(repo):
+    rootdir = repo.get_dir('/')
+    testfile = rootdir.upload('old content', 'testfile-%s' % randstring())
+    old_id = testfile.id
+
+    testfile.update('new content')
+    assert testfile.id != old_id
+    assert testfile.size == len('new content')
+    assert testfile.get_content() == b'new content'
+
+def test_upload_many_files(repo):
+    rootdir = repo.get_dir('/')
+    parentdir = rootdir.mkdir('测试目录-%s' % randstring())
+
+    fnames = ['测试文件-%03d.txt' % i for i in range(25)]
+    files = parentdir.upload_many([(fname, 'content of %s' % fname) for fname in fnames],
+                                  batch_count=10)
+    assert [f.name for f in files] == fnames
+    assert files[3].size == len(('content of %s' % fnames[3]).encode('utf-8'))
+    assert files[3].get_content() == ('content of %s' % fnames[3]).encode('utf-8')
+
+    entries = parentdir.ls(force_refresh=True)
+    assert sorted(e.name for e in entries) == fnames
+
+def test_upload_tree(repo, tmpdir):
+    localroot = tmpdir.mkdir('tree')
+    localroot.mkdir('子目录').mkdir('sub').join('b.txt').write('content b')
+    localroot.join('a.txt').write('content a')
+    localroot.mkdir('empty').mkdir('nested')
+
+    rootdir = repo.get_dir('/')
+    report = rootdir.upload_tree(str(localroot), workers=2)
+    assert len(report.succeeded) == 2
+    assert not report.failed
+    assert report.bytes_transferred == len('content a') + len('content b')
+
+    assert repo.get_file('/子目录/sub/b.txt').get_content() == b'content b'
+    assert repo.get_file('/a.txt').get_content() == b'content a'
+    assert len(repo.get_dir('/empty/nested').ls()) == 0
+
+def test_download_tree(repo, tmpdir):
+    rootdir = repo.get_dir('/')
+    subdir = rootdir.mkdir('子目录')
+    subdir.upload('content b', 'b.txt')
+    rootdir.upload('content a', 'a.txt')
+    subdir.mkdir('empty')
+
+    localroot = tmpdir.join('tree')
+    report = rootdir.download_tree(str(localroot), workers=2)
+    assert len(report.succeeded) == 2
+    assert localroot.join('子目录', 'b.txt').read() == 'content b'
+    assert localroot.join('a.txt').read() == 'content a'
+    assert localroot.join('子目录', 'empty').isdir()
+
+    report = rootdir.download_tree(str(localroot), workers=2)
+    assert len(report.succeeded) == 0
+    assert len(report.skipped) == 2
+
+    repo.get_file('/a.txt').update('new content a')
+    report = rootdir.download_tree(str(localroot), workers=2)
+    assert [r.remote_path for r in report.succeeded] == ['/a.txt']
+    assert localroot.join('a.txt').read() == 'new content a'
+
+def test_walk(repo):
+    rootdir = repo.get_dir('/')
+    subdir = rootdir.mkdir('子目录')
+    subdir.mkdir('nested').upload('content c', 'c.txt')
+    subdir.upload('content b', 'b.txt')
+    rootdir.upload('content a', 'a.txt')
+
+    walked = [(dirpath, sorted(d.name for d in dirs), sorted(f.name for f in files))
+              for dirpath, dirs, files in repo.walk()]
+    assert walked == [
+        ('/', ['子目录'], ['a.txt']),
+        ('/子目录', ['nested'], ['b.txt']),
+        ('/子目录/nested', [], ['c.txt']),
+    ]
+
+    walked = [(dirpath, [d.name for d in dirs], files)
+              for dirpath, dirs, files in repo.walk('/子目录', dirs_only=True)]
+    assert walked == [('/子目录', ['nested'], []), ('/子目录/nested', [], [])]
+
+    for dirpath, dirs, _ in repo.walk():
+        assert dirpath == '/'
+        del dirs[:]
+
+def test_walk_without_recursive_listing(repo, monkeypatch):
+    monkeypatch.setattr(files.SeafDir, '_get_recursive_listing', lambda self, dirs_only: None)
+    rootdir = repo.get_dir('/')
+    rootdir.mkdir('sub').upload('content b', 'b.txt')
+    rootdir.upload('content a', 'a.txt')
+    entries = rootdir.ls(force_refresh=True)
+
+    walked = [(dirpath, [d.name for d in dirs], sorted(f.name for f in files))
+              for dirpath, dirs, files in rootdir.walk()]
+    assert walked == [('/', ['sub'], ['a.txt']), ('/sub', [], ['b.txt'])]
+    assert len(rootdir.load_tree()) == 3
+    assert rootdir.entries == entries
+
+def test_listing_revalidation(client, repo):
+    rootdir = repo.get_dir('/')
+    rootdir.upload('content', 'a.txt')
+    entries = rootdir.ls(force_refresh=True)
+    assert client.listings.get((repo.id, '/')) is not None
+
+    assert [e.name for e in rootdir.ls(force_refresh=True)] == [e.name for e in entries]
+    assert [e.name for e in repo.get_dir('/').ls()] == ['a.txt']
+
+    rootdir.upload('content', 'b.txt')
+    assert sorted(e.name for e in rootdir.ls(force_refresh=True)) == ['a.txt', 'b.txt']
+
+def test_load_tree(repo):
+    rootdir = repo.get_dir('/')
+    subdir = rootdir.mkdir('子目录')
+    subdir.upload('content b', 'b.txt')
+    rootdir.upload('content a', 'a.txt')
+
+    table = repo.load_tree()
+    assert len(table) == 3
+    assert table.total_size == len('content a') + len('content b')
+    assert sorted(dirent.path for dirent in table) == ['/a.txt', '/子目录', '/子目录/b.txt']
+    seaffile = [dirent for dirent in table if dirent.name == 'b.txt'][0]
+    assert seaffile.get_content() == b'content b'
+
+    table = repo.load_tree(dirs_only=True)
+    assert [dirent.path for dirent in table] == ['/子目录']
+
+def test_dirent_slots():
+    first = files.SeafFile('r' * 36, '/a/b/first.txt', '0' * 40, 1)
+    second = files.SeafFile('r' * 36, '/a/b/' + 'second.txt', '0' * 40, 2)
+    assert not hasattr(first, '__dict__')
+    assert first.name == 'first.txt'
+    assert first.path == '/a/b/first.txt'
+    assert first._parent is second._parent
+
+    seafdir = files.SeafDir('r' * 36, '/', '0' * 40)
+    assert seafdir.path == '/' and seafdir.entries is None
+    first._copy_from(second)
+    assert (first.path, first.size) == ('/a/b/second.txt', 2)
+
+def test_dirent_table():
+    table = files.DirentTable('r' * 36)
+    table.append('/', 'folder', True, '1' * 40, mtime=10)
+    table.append_json({'type': 'file', 'name': 'a.txt', 'id': 'ab' * 20,
+                       'size': 5, 'mtime': '2020-01-01T00:00:00+00:00'}, '/folder')
+    assert len(table) == 2
+    assert table.parents == ['/', '/folder']
+    assert table.path(1) == '/folder/a.txt'
+    assert table.id(1) == 'ab' * 20
+    assert list(table.mtimes) == [10, 1577836800]
+    assert table.total_size == 5
+
+    seafdir, seaffile = table
+    assert isinstance(seafdir, files.SeafDir) and seafdir.path == '/folder'
+    assert (seaffile.path, seaffile.id, seaffile.size) == ('/folder/a.txt', 'ab' * 20, 5)
+    assert [d.name for d in table[-1:]] == ['a.txt']
+
+def test_iter_entries(repo):
+    rootdir = repo.get_dir('/')
+    rootdir.mkdir('子目录')
+    rootdir.upload('content a', 'a.txt')
+
+    entries = list(rootdir.iter_entries())
+    assert sorted(dirent.name for dirent in entries) == ['a.txt', '子目录']
+    assert [dirent.size for dirent in entries if dirent.name == 'a.txt'] == [len('content a')]
+    assert rootdir.id == repo.get_dir('/').id
+
+    rootdir.ls(force_refresh=True)
+    assert sorted(dirent.name for dirent in rootdir.iter_entries()) == ['a.txt', '子目录']
+
+def test_batch_copy_move(client, repo):
+    rootdir = repo.get_dir('/')
+    srcdir = rootdir.mkdir('src')
+    dstdir = rootdir.mkdir('dst')
+    uploaded = srcdir.upload_many([('%d.txt' % i, 'content %d' % i) for i in range(5)])
+    srcdir.mkdir('子目录')
+
+    copies = repo.batch_copy(['0.txt', '子目录'], '/src', None, '/dst', batch_size=1)
+    assert sorted(dirent.path for dirent in copies) == ['/dst/0.txt', '/dst/子目录']
+    assert sorted(dirent.name for dirent in dstdir.ls(force_refresh=True)) == ['0.txt', '子目录']
+    assert len(srcdir.ls(force_refresh=True)) == 6
+
+    moved = repo.batch_move(uploaded[1:3], '/src', repo, '/dst')
+    assert moved == uploaded[1:3]
+    assert [dirent.path for dirent in uploaded[1:3]] == ['/dst/1.txt', '/dst/2.txt']
+    assert uploaded[1].get_content() == b'content 1'
+    assert len(srcdir.ls(force_refresh=True)) == 4
+
+    temp_repo = client.repos.create_repo('temp_repo')
+    try:
+        moved = repo.batch_move(['3.txt', uploaded[4]], '/src', temp_repo.id, '/')
+        assert all(dirent.repo_id == temp_repo.id for dirent in moved)
+        assert sorted(dirent.name for dirent in temp_repo.get_dir('/').ls()) == ['3.txt', '4.txt']
+        assert moved[1].get_content() == b'content 4'
+    finally:
+        temp_repo.delete()
+
+def test_delete_many(repo):
+    rootdir = repo.get_dir('/')
+    uploaded = rootdir.upload_many([('%d.txt' % i, 'content') for i in range(5)])
+    rootdir.mkdir('子目录')
+    rootdir.ls(force_refresh=True)
+
+    results = rootdir.delete_many(['0.txt', '子目录', uploaded[1], uploaded[2]],
+                                  batch_size=3, workers=2)
+    assert [result.names for result in results] == [['0.txt', '子目录', '1.txt'], ['2.txt']]
+    assert all(result.succeeded for result in results)
+    assert sorted(dirent.name for dirent in rootdir.entries) == ['3.txt', '4.txt']
+    assert sorted(dirent.name for dirent in rootdir.ls(force_refresh=True)) == ['3.txt', '4.txt']
@@ -0,0 +1,53 @@
+#coding: UTF-8
+
+import email.parser
+import email.policy
+import io
+import os
+
+from seafileapi.multipart import MultipartEncoder
+from tests.utils import datafile
+
+def _decode(encoder):
+    body = encoder.to_string()
+    msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b'Content-Type: ' + encoder.content_type.encode() + b'\r\n\r\n' + body)
+    parts = []
+    for part in msg.iter_parts():
+        parts.append((part.get_param('name', header='content-disposition'),
+                      part.get_param('filename', header='content-disposition'),
+                      part.get_payload(decode=True)))
+    return body, parts
+
+def test_encode_fields_and_files():
+    fpath = datafile('aliedit.tar.gz')
+    with open(fpath, 'rb') as fp:
+        fcontent = fp.read()
+    with open(fpath, 'rb') as fp:
+        encoder = MultipartEncoder([
+            ('parent_dir', '/测试目录'),
+            ('file', ('aliedit.tar.gz', fp)),
+            ('file', ('测试文件.txt', 'line 1\nline 2\n')),
+        ], chunk_size=1024)
+        body, parts = _decode(encoder)
+
+    assert encoder.len == len(body)
+    assert parts == [
+        ('parent_dir', None, '/测试目录'.encode('utf-8')),
+        ('file', 'aliedit.tar.gz', fcontent),
+        ('file', '测试文件.txt', b'line 1\nline 2\n'),
+    ]
+
+def test_encoder_can_be_sent_again():
+    encoder = MultipartEncoder([('file', ('a.txt', io.BytesIO(b'content')))])
+    assert encoder.to_string() == encoder.to_string()
+
+def test_unknown_length_for_pipes():
+    rfd, wfd = os.pipe()
+    os.write(wfd, b'from a pipe')
+    os.close(wfd)
+    with os.fdopen(rfd, 'rb') as pipe:
+        encoder = MultipartEncoder([('file', ('a.txt', pipe))])
+        assert encoder.len is None
+        _, parts = _decode(encoder)
+    assert parts == [('file', 'a.txt', b'from a pipe')]
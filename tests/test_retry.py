@@ -0,0 +1,85 @@
+#coding: UTF-8
+
+import io
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from seafileapi.client import SeafileApiClient
+from seafileapi.exceptions import ClientHttpError
+from seafileapi.multipart import MultipartEncoder
+from seafileapi.retry import RetryPolicy, NO_RETRY, parse_retry_after, is_replayable
+
+class _Response(object):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+def _client(responses, **kwargs):
+    """Return an offline client whose requests get `responses` in turn,
+    along with the list of the requests sent"""
+    client = SeafileApiClient('http://127.0.0.1:8000', token='x' * 40, **kwargs)
+    sent = []
+    def request(method, url, **kw):
+        sent.append(method)
+        resp = responses.pop(0)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+    client.session.request = client.fileserver_session.request = request
+    return client, sent
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    assert 8 < parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+
+def test_backoff_delay():
+    policy = RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+    assert [policy.get_delay(n) for n in (1, 2, 3, 4)] == [1, 2, 4, 5]
+    assert policy.get_delay(1, '7') == 7
+    assert RetryPolicy(max_retry_after=2).get_delay(1, '7') == 2
+    assert 0 <= RetryPolicy(backoff=1).get_delay(3) <= 4
+
+def test_should_retry():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry('get', 1, 503)
+    assert policy.should_retry('DELETE', 2)
+    assert not policy.should_retry('GET', 3, 503)
+    assert not policy.should_retry('GET', 1, 500)
+    assert not policy.should_retry('POST', 1, 503)
+    assert RetryPolicy(methods=['POST']).should_retry('POST', 1, 429)
+
+def test_is_replayable():
+    assert is_replayable(None) and is_replayable({'a': 1}) and is_replayable(b'x')
+    assert is_replayable(MultipartEncoder([('file', ('a.txt', io.BytesIO(b'x')))]))
+    assert not is_replayable(iter([b'x']))
+
+def test_client_retries():
+    policy = RetryPolicy(backoff=0.001)
+    client, sent = _client([_Response(503), requests.ConnectionError(),
+                            _Response(429, {'Retry-After': '0'}), _Response(200)],
+                           retry=policy)
+    assert client.get('/api2/repos/').status_code == 200
+    assert len(sent) == 4
+
+    client, sent = _client([_Response(503)] * 4, retry=policy)
+    with pytest.raises(ClientHttpError) as excinfo:
+        client.delete('/api2/repos/x/')
+    assert excinfo.value.code == 503
+    assert len(sent) == 4
+
+    client, sent = _client([_Response(503)], retry=policy)
+    with pytest.raises(ClientHttpError):
+        client.post('/api2/repos/')
+    assert len(sent) == 1
+
+    client, sent = _client([requests.ConnectionError()], retry=NO_RETRY)
+    with pytest.raises(requests.ConnectionError):
+        client.get('/api2/repos/')
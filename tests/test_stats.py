@@ -0,0 +1,74 @@
+#coding: UTF-8
+
+import requests
+
+from seafileapi.client import SeafileApiClient
+from seafileapi.retry import RetryPolicy
+from seafileapi.stats import ClientStats, RequestRecord, endpoint_template
+
+REPO_ID = '1f7d3c5e-2a4b-4c6d-8e9f-0a1b2c3d4e5f'
+
+def _response(status_code, content=b''):
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp._content, resp._content_consumed = content, True
+    resp.request = requests.Request('GET', 'http://127.0.0.1:8000/').prepare()
+    return resp
+
+def test_endpoint_template():
+    assert endpoint_template('http://s/api2/repos/%s/dir/?p=/a' % REPO_ID) == \
+        '/api2/repos/{repo_id}/dir/'
+    assert endpoint_template('http://s/api2/repos/%s/file/%s/' % (REPO_ID, 'a' * 40)) == \
+        '/api2/repos/{repo_id}/file/{id}/'
+    assert endpoint_template('http://s/api/v2.1/groups/12/members/') == \
+        '/api/v2.1/groups/{n}/members/'
+    assert endpoint_template('http://s/seafhttp/files/tok-en/a.txt') == '/seafhttp/files/{token}'
+    assert endpoint_template('http://fs:8082/upload-api/token') == '/upload-api/{token}'
+
+def test_stats_counters():
+    stats = ClientStats()
+    started, ended = [], []
+    stats.on_request_start.append(started.append)
+    stats.on_request_end.append(ended.append)
+    for elapsed, status in ((0.002, 200), (0.2, 200), (3, 500)):
+        record = stats.request_started('get', 'http://s/api2/repos/%s/' % REPO_ID)
+        record.start -= elapsed
+        record.status, record.attempts, record.bytes_received = status, 2, 10
+        stats.request_ended(record)
+    assert len(started) == len(ended) == 3
+    endpoint = stats['GET', '/api2/repos/{repo_id}/']
+    assert (endpoint.count, endpoint.errors, endpoint.retries) == (3, 1, 3)
+    assert endpoint.bytes_received == 30
+    assert endpoint.percentile(50) == 0.25 and endpoint.percentile(100) == 5
+    assert stats.snapshot()['GET /api2/repos/{repo_id}/']['latency_buckets'][0.005] == 1
+    assert stats.total.count == 3
+
+    stats.reset()
+    stats.enabled = False
+    assert stats.request_started('GET', 'http://s/') is None
+    assert len(stats) == 0
+
+def test_client_stats():
+    client = SeafileApiClient('http://127.0.0.1:8000', token='x' * 40,
+                              retry=RetryPolicy(backoff=0.001))
+    responses = [_response(503), _response(200, b'[]'), requests.ConnectionError()]
+    def request(method, url, **kw):
+        resp = responses.pop(0)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+    client.session.request = request
+    records = []
+    client.stats.on_request_end.append(records.append)
+    client.get('/api2/repos/%s/dir/' % REPO_ID)
+    # The sleep before the retry only counts in the elapsed time
+    assert records[0].latency < records[0].elapsed
+    try:
+        client.post('/api2/repos/')
+    except requests.ConnectionError:
+        pass
+    listing = client.stats['GET', '/api2/repos/{repo_id}/dir/']
+    assert (listing.count, listing.retries, listing.errors) == (1, 1, 0)
+    assert listing.bytes_received == 2
+    assert client.stats['POST', '/api2/repos/'].errors == 1
+    assert isinstance(RequestRecord('GET', 'http://s/').endpoint, str)
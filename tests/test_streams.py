@@ -0,0 +1,94 @@
+#coding: UTF-8
+
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+
+from seafileapi.streams import RangeReader
+
+def _reader(content, **kwargs):
+    ranges = []
+    def get_range(start, end):
+        ranges.append((start, end))
+        return content[start:end]
+    return RangeReader(get_range, len(content), **kwargs), ranges
+
+def test_range_reader_seek():
+    content = os.urandom(1000)
+    reader, ranges = _reader(content, block_size=100, readahead=0)
+    assert reader.seekable()
+    assert reader.seek(-50, io.SEEK_END) == 950
+    assert reader.read() == content[950:]
+    assert ranges == [(900, 1000)]
+    reader.seek(10)
+    assert reader.read(250) == content[10:260]
+    assert reader.tell() == 260
+    assert reader.seek(-20, io.SEEK_CUR) == 240
+    assert reader.read(5) == content[240:245]
+    assert reader.read(0) == b''
+    reader.seek(2000)
+    assert reader.read() == b''
+    with pytest.raises(ValueError):
+        reader.seek(-1)
+
+def test_range_reader_readahead_and_cache():
+    content = os.urandom(1000)
+    reader, ranges = _reader(content, block_size=100, readahead=3, cache_blocks=4)
+    assert reader.read(50) == content[:50]
+    assert ranges == [(0, 400)]
+    assert reader.read(350) == content[50:400]
+    assert reader.read(10) == content[400:410]
+    assert ranges == [(0, 400), (400, 800)]
+    # Still cached
+    reader.seek(450)
+    reader.read(10)
+    assert reader.requests == 2
+    # Evicted
+    reader.seek(0)
+    reader.read(10)
+    assert ranges[-1] == (0, 100)
+
+def test_range_reader_checksum():
+    content = os.urandom(1000)
+    reader, _ = _reader(content, block_size=64)
+    reader.read(100)
+    reader.seek(50)
+    reader.read(100)
+    assert reader.read() == content[150:]
+    assert reader.checksum == hashlib.sha1(content).hexdigest()
+
+    reader, _ = _reader(content, block_size=64)
+    reader.seek(100)
+    reader.read()
+    assert reader.checksum is None
+
+def test_range_reader_zipfile():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as archive:
+        archive.writestr('a.txt', b'a' * 10000)
+        archive.writestr('b.txt', b'b' * 10)
+    reader, ranges = _reader(buf.getvalue(), block_size=1024, readahead=1)
+    with zipfile.ZipFile(reader) as archive:
+        assert archive.namelist() == ['a.txt', 'b.txt']
+        assert archive.read('b.txt') == b'b' * 10
+    assert all(end - start <= 2048 for start, end in ranges)
+
+def test_range_reader_without_ranges():
+    content = os.urandom(1000)
+    requests = []
+    def get_range(start, end):
+        requests.append((start, end))
+        return io.BytesIO(content)
+    reader = RangeReader(get_range, len(content), block_size=100, readahead=1, cache_blocks=2)
+    assert reader.read(150) == content[:150]
+    reader.seek(120)
+    assert reader.read(30) == content[120:150]
+    reader.seek(500)
+    assert reader.read() == content[500:]
+    assert requests == [(0, 200)]
+    reader.seek(0)
+    with pytest.raises(IOError):
+        reader.read(10)
@@ -0,0 +1,98 @@
+#coding: UTF-8
+
+import threading
+import time
+
+from seafileapi.throttle import Limit, Throttle, NO_THROTTLE
+
+def test_rate_limit():
+    limit = Limit(rate=100, burst=1)
+    start = time.monotonic()
+    for _ in range(11):
+        limit.acquire()
+        limit.release(200)
+    assert time.monotonic() - start >= 0.09
+
+def test_max_in_flight():
+    limit = Limit(max_in_flight=2)
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def work():
+        limit.acquire()
+        with lock:
+            in_flight.append(1)
+            peak.append(len(in_flight))
+        time.sleep(0.01)
+        with lock:
+            in_flight.pop()
+        limit.release(200)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+
+def test_adaptive_rate():
+    limit = Limit(rate=40)
+    limit.release(429)
+    assert limit.rate == 20
+    limit.release(429)
+    assert limit.rate == 20, 'a burst of 429s only halves the rate once'
+    limit._last_change -= 2
+    limit.release(200)
+    assert limit.rate == 21
+
+    unlimited = Limit(min_rate=5)
+    unlimited.release(429)
+    assert unlimited.rate == 5
+    assert Limit(adaptive=False).release(429) is None
+
+def test_limits_for():
+    listing, mutation, transfer = Limit(), Limit(), Limit()
+    throttle = Throttle(listing=listing, mutation=mutation, transfer=transfer)
+    assert throttle.limits_for('GET') == [listing, throttle.api]
+    assert throttle.limits_for('delete') == [mutation, throttle.api]
+    assert throttle.limits_for('POST', fileserver=True) == [transfer, throttle.fileserver]
+    assert NO_THROTTLE.limits_for('GET') == []
+
+def test_client_adapts_to_429():
+    from seafileapi.client import SeafileApiClient
+    from tests.test_retry import _Response
+
+    client = SeafileApiClient('http://127.0.0.1:8000', token='x' * 40)
+    responses = [_Response(429, {'Retry-After': '0'}), _Response(200)]
+    client.session.request = lambda method, url, **kwargs: responses.pop(0)
+    assert client.get('/api2/repos/').status_code == 200
+    assert client.throttle.api.rate is not None
+    assert client.throttle.fileserver.rate is None
+
+def test_streamed_response_holds_limit():
+    from seafileapi.client import SeafileApiClient
+    from tests.test_retry import _Response
+
+    transfer = Limit(max_in_flight=1)
+    client = SeafileApiClient('http://127.0.0.1:8000', token='x' * 40,
+                              throttle=Throttle(transfer=transfer))
+    client.fileserver_session.request = lambda method, url, **kwargs: _Response(200)
+    url = 'http://127.0.0.1:8082/seafhttp/files/token/a.txt'
+
+    first = client.get(url, stream=True)
+    second = []
+    thread = threading.Thread(target=lambda: second.append(client.get(url, stream=True)))
+    thread.start()
+    thread.join(0.1)
+    assert not second, 'the body of the first response is still in flight'
+    first.close()
+    thread.join()
+    second[0].close()
+    second[0].close()
+    assert transfer._semaphore.acquire(blocking=False)
+    transfer._semaphore.release()
+
+    # Other requests release the limit right away
+    client.get(url)
+    client.get(url)
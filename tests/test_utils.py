@@ -0,0 +1,31 @@
+#coding: UTF-8
+
+import json
+
+import pytest
+
+from seafileapi.utils import iter_json_array
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64 * 1024])
+def test_iter_json_array(chunk_size):
+    items = [{'name': '文件-%d' % i, 'size': i * 1000} for i in range(100)]
+    items += [12345, -2.5e-3, 'text', None, [1, [2]]]
+
+    data = json.dumps(items, ensure_ascii=False).encode('utf-8')
+    assert list(iter_json_array(_chunks(data, chunk_size))) == items
+
+    data = json.dumps({'dir_id': 'x', 'dirent_list': items, 'user_perm': 'rw'}).encode('utf-8')
+    assert list(iter_json_array(_chunks(data, chunk_size), 'dirent_list')) == items
+
+def test_iter_json_array_errors():
+    assert list(iter_json_array([b' [ ] '])) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[{"name": "a"}, ']))
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'"uptodate"']))
+    with pytest.raises(KeyError):
+        list(iter_json_array([b'{"dir_id": "x"}'], 'dirent_list'))
@@ -0,0 +1,69 @@
+#coding: UTF-8
+
+import io
+import os
+import zipfile
+
+import pytest
+
+from seafileapi.zipstream import extract_stream
+
+class _Unseekable(io.RawIOBase):
+    """Makes zipfile write data descriptors, like a streaming writer"""
+    def __init__(self):
+        self.buf = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buf.write(data)
+
+MEMBERS = [
+    ('a.txt', b'hello' * 1000),
+    ('dir/b.bin', os.urandom(200000)),
+    ('dir/signature.txt', b'PK\x07\x08' * 50),
+    ('empty', b''),
+    ('目录/测试.txt', u'中文'.encode('utf-8')),
+]
+
+def _archive(method, zip64=False, streamed=True, members=MEMBERS):
+    out = _Unseekable() if streamed else io.BytesIO()
+    with zipfile.ZipFile(out, 'w', method) as archive:
+        archive.writestr('dir/', b'')
+        for name, data in members:
+            with archive.open(zipfile.ZipInfo(name), 'w', force_zip64=zip64) as fp:
+                fp.write(data)
+    return (out.buf if streamed else out).getvalue()
+
+@pytest.mark.parametrize('method', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+@pytest.mark.parametrize('zip64', [False, True])
+@pytest.mark.parametrize('streamed', [False, True])
+def test_extract_stream(tmpdir, method, zip64, streamed):
+    data = _archive(method, zip64, streamed)
+    dest = str(tmpdir.join('out'))
+    names = extract_stream(io.BytesIO(data), dest, chunk_size=1000)
+    assert names == ['dir/'] + [name for name, _ in MEMBERS]
+    for name, content in MEMBERS:
+        with open(os.path.join(dest, *name.split('/')), 'rb') as fp:
+            assert fp.read() == content
+
+@pytest.mark.parametrize('name', ['../evil.txt', '/etc/evil.txt', 'a/../../evil.txt',
+                                  'c:/evil.txt', '..\\evil.txt'])
+def test_extract_stream_refuses_unsafe_paths(tmpdir, name):
+    data = _archive(zipfile.ZIP_DEFLATED, members=[(name, b'evil')])
+    with pytest.raises(zipfile.BadZipFile):
+        extract_stream(io.BytesIO(data), str(tmpdir.join('out')))
+    assert not tmpdir.join('evil.txt').exists()
+
+def test_extract_stream_checks_crc(tmpdir):
+    data = bytearray(_archive(zipfile.ZIP_STORED, streamed=False,
+                              members=[('a.txt', b'hello world')]))
+    pos = data.index(b'hello world')
+    data[pos] = ord('j')
+    with pytest.raises(zipfile.BadZipFile):
+        extract_stream(io.BytesIO(bytes(data)), str(tmpdir.join('out')))
+    assert not tmpdir.join('out', 'a.txt').exists()
+
+    with pytest.raises(zipfile.BadZipFile):
+        extract_stream(io.BytesIO(bytes(data[:pos + 5])), str(tmpdir.join('out')))